@@ -1,18 +1,423 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse
-import shutil
+from fastapi import FastAPI, UploadFile, File, Request, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import List
+import asyncio
 import os
-from model_utils import analyze_with_heuristics
+import sys
+import time
+from model_utils import (score_gray, analyze_batch, decode_image, voltages_to_gray, tile_regions,
+                         HEURISTIC_SIGNATURE, TOP_REGIONS)
+from result_cache import ResultCache
+from streaming import StreamSessions
+from jobs import JobQueue, QueueFull
+from similarity import SimilarityIndex, fingerprint
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.scan_payload import decode_matrix, is_matrix_payload
+from common.instrumentation import Metrics, SamplingProfiler
+
+# OpenCV/NumPy release the GIL, so a thread pool sized to the cores runs the
+# heuristics in parallel without pickling images to worker processes.
+ANALYSIS_WORKERS = int(os.environ.get("SCAN_ANALYSIS_WORKERS", os.cpu_count() or 1))
+# Analyses admitted at once (running plus waiting for a worker)
+MAX_CONCURRENT_ANALYSES = int(os.environ.get("SCAN_MAX_CONCURRENT_ANALYSES", ANALYSIS_WORKERS * 2))
+
+executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="analysis")
+analysis_slots = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+
+# Results keyed by upload hash; SCAN_CACHE_PATH enables persistence across restarts
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("SCAN_CACHE_ENTRIES", 4096)),
+    namespace=HEURISTIC_SIGNATURE,
+    path=os.environ.get("SCAN_CACHE_PATH"),
+)
+
+# Row-by-row scans in progress, dropped after SCAN_STREAM_TTL idle seconds
+stream_sessions = StreamSessions(ttl=float(os.environ.get("SCAN_STREAM_TTL", 600)))
+
+# Fingerprints of every analyzed scan; each result lists the SCAN_SIMILAR closest
+# earlier scans. SCAN_INDEX_PATH enables persistence across restarts
+similarity_index = SimilarityIndex(
+    max_entries=int(os.environ.get("SCAN_INDEX_ENTRIES", 100000)),
+    path=os.environ.get("SCAN_INDEX_PATH"),
+)
+SIMILAR_SCANS = int(os.environ.get("SCAN_SIMILAR", 5))
+
+# Submit/poll analysis jobs: SCAN_JOB_WORKERS threads, at most SCAN_JOB_QUEUE waiting
+# (more get 429 + Retry-After), finished jobs kept SCAN_JOB_TTL seconds for polling
+job_queue = JobQueue(
+    workers=int(os.environ.get("SCAN_JOB_WORKERS", ANALYSIS_WORKERS)),
+    max_queued=int(os.environ.get("SCAN_JOB_QUEUE", 64)),
+    ttl=float(os.environ.get("SCAN_JOB_TTL", 600)),
+)
+# Longest a GET /jobs/{id}?wait= request is held open
+MAX_JOB_WAIT = 30.0
+# Largest region grid (?tiles=N asks for N x N) an analysis request may ask for
+MAX_TILES = 64
+
+# Scraped from GET /metrics. The profiler is off unless SCAN_PROFILE=1 and is
+# switched at runtime with POST /debug/profile?enabled=true|false
+metrics = Metrics(prefix="scanprotech_")
+metrics.describe("http_request_seconds", "Request latency by route")
+metrics.describe("http_requests_total", "Requests by route and status")
+metrics.describe("analysis_wait_seconds", "Time analyses waited for an admission slot")
+metrics.describe("analysis_decode_seconds", "Payload decode time (image or scan matrix) per analysis")
+metrics.describe("analysis_features_seconds", "Feature extraction and scoring time per analysis")
+metrics.describe("similarity_seconds", "Similarity index insert and top-k query time")
+metrics.describe("jobs_completed_total", "Jobs that finished with a result")
+metrics.describe("jobs_failed_total", "Jobs that raised an error")
+metrics.describe("jobs_rejected_total", "Job submissions turned away with 429 (queue full)")
+metrics.describe("cache_hits_total", "Result cache lookups that found an entry")
+metrics.describe("cache_misses_total", "Result cache lookups that found nothing")
+metrics.describe("cache_evictions_total", "Result cache entries dropped to stay under max_entries")
+# Stats fields that only ever grow; exported as counters, the rest of the stats as gauges
+JOB_TOTALS = ("completed", "failed", "rejected")
+CACHE_TOTALS = ("hits", "misses", "evictions")
+profiler = SamplingProfiler()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    job_queue.start()
+    if os.environ.get("SCAN_PROFILE") == "1":
+        profiler.start()
+    yield
+    profiler.stop()
+    job_queue.stop()
+    executor.shutdown(wait=False, cancel_futures=True)
+    result_cache.close()
+    similarity_index.close()
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Route templates, not raw paths, so job and session ids don't each get a series
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.observe("http_request_seconds", time.perf_counter() - start, method=request.method, path=path)
+    metrics.inc("http_requests_total", method=request.method, path=path, status=response.status_code)
+    return response
+
+
+async def run_cached_analysis(func, payload, tiles=0):
+    key = result_cache.key(payload, tile_variant(tiles))
+    result = result_cache.get(key)
+    if result is not None:
+        return result, True
+    if tiles:
+        # Tiled analyses spread their bands over the pool, so they coordinate from outside it
+        result = await run_analysis(partial(func, tiles=tiles, map_func=executor.map), payload, coordinator=True)
+    else:
+        result = await run_analysis(func, payload)
+    # With SCAN_CACHE_PATH set, put commits to SQLite; keep that disk write off the event loop
+    await asyncio.to_thread(result_cache.put, key, result)
+    return result, False
+
+
+async def run_analysis(func, *args, coordinator=False):
+    # Keep CPU-bound work off the event loop so one large scan can't stall other requests
+    start = time.perf_counter()
+    async with analysis_slots:
+        metrics.observe("analysis_wait_seconds", time.perf_counter() - start)
+        if coordinator:
+            return await asyncio.to_thread(func, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
+
+
+def tile_variant(tiles):
+    # Cache key variant: tiled results carry regions the plain ones don't
+    if not 0 <= tiles <= MAX_TILES:
+        raise HTTPException(status_code=400, detail=f"tiles must be between 0 and {MAX_TILES}")
+    return f"tiles={tiles}|{TOP_REGIONS}" if tiles else ""
+
+
+def index_scan(key, gray, result):
+    # Scans are indexed under their plain cache key, whatever options they were analyzed with
+    with metrics.time("similarity_seconds", op="add"):
+        similarity_index.add(key, fingerprint(gray, result),
+                             {"object": result["object"], "threat_score": result["threat_score"]})
+
+
+def similar_scans(key):
+    # Closest earlier scans to an indexed one, with their verdicts
+    with metrics.time("similarity_seconds", op="query"):
+        return similarity_index.nearest_to(key, SIMILAR_SCANS)
+
+
+def analyze_payload(payload, tiles=0, map_func=map):
+    with metrics.time("analysis_decode_seconds", kind="matrix"):
+        gray = voltages_to_gray(decode_matrix(payload))
+    with metrics.time("analysis_features_seconds", kind="matrix"):
+        result = score_gray(gray, tiles, map_func)
+    index_scan(result_cache.key(payload), gray, result)
+    return result
+
+
+def analyze_image(payload, tiles=0, map_func=map):
+    with metrics.time("analysis_decode_seconds", kind="image"):
+        gray = decode_image(payload)
+    with metrics.time("analysis_features_seconds", kind="image"):
+        result = score_gray(gray, tiles, map_func)
+    index_scan(result_cache.key(payload), gray, result)
+    return result
+
+
+def decode_item(payload):
+    # Batch items are either scan matrix payloads or encoded images
+    try:
+        if is_matrix_payload(payload):
+            return voltages_to_gray(decode_matrix(payload))
+        return decode_image(payload)
+    except (OSError, ValueError) as e:
+        return e
+
+
+def analyze_items(payloads):
+    # Coordinator runs outside the pool; decode and feature groups fan out onto it
+    with metrics.time("analysis_decode_seconds", kind="batch"):
+        decoded = list(executor.map(decode_item, payloads))
+    valid = [i for i, item in enumerate(decoded) if not isinstance(item, Exception)]
+    with metrics.time("analysis_features_seconds", kind="batch"):
+        scores = analyze_batch([decoded[i] for i in valid], map_func=executor.map)
+
+    results = [{"error": f"Could not decode item: {item}"} if isinstance(item, Exception) else None
+               for item in decoded]
+    for i, score in zip(valid, scores):
+        results[i] = {"heuristic": score}
+        index_scan(result_cache.key(payloads[i]), decoded[i], score)
+    return results
 
-app = FastAPI()
 
 @app.post("/analyze")
-async def analyze_scan(file: UploadFile = File(...)):
-    temp_path = f"temp_{file.filename}"
-    with open(temp_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+async def analyze_scan(file: UploadFile = File(...), tiles: int = 0):
+    # Decoded from memory: no temp files, no filename collisions between clients.
+    # tiles=N adds an N x N region threat map and the top regions to the result.
+    contents = await file.read()
+    try:
+        result, cached = await run_cached_analysis(analyze_image, contents, tiles)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode image: {e}")
+
+    similar = await asyncio.to_thread(similar_scans, result_cache.key(contents))
+    return JSONResponse(content={"heuristic": result, "cached": cached, "similar": similar})
+
+
+@app.post("/analyze/raw")
+async def analyze_raw_scan(request: Request, tiles: int = 0):
+    # Body is a common.scan_payload matrix: float32 voltages plus row lengths
+    payload = await request.body()
+    try:
+        result, cached = await run_cached_analysis(analyze_payload, payload, tiles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    similar = await asyncio.to_thread(similar_scans, result_cache.key(payload))
+    return JSONResponse(content={"heuristic": result, "cached": cached, "similar": similar})
+
+
+@app.post("/analyze/batch")
+async def analyze_scan_batch(files: List[UploadFile] = File(...)):
+    payloads = [await file.read() for file in files]
+    keys = [result_cache.key(payload) for payload in payloads]
+    results = [None] * len(payloads)
+    misses = []
+    for i, key in enumerate(keys):
+        cached = result_cache.get(key)
+        if cached is None:
+            misses.append(i)
+        else:
+            results[i] = {"heuristic": cached, "cached": True}
+
+    if misses:
+        async with analysis_slots:
+            computed = await asyncio.to_thread(analyze_items, [payloads[i] for i in misses])
+        for i, result in zip(misses, computed):
+            if "heuristic" in result:
+                result["cached"] = False
+            results[i] = result
+
+        def cache_results():
+            for i in misses:
+                if "heuristic" in results[i]:
+                    result_cache.put(keys[i], results[i]["heuristic"])
+        await asyncio.to_thread(cache_results)
+
+    def add_similar():
+        for key, result in zip(keys, results):
+            if "heuristic" in result:
+                result["similar"] = similar_scans(key)
+    await asyncio.to_thread(add_similar)
+
+    for file, result in zip(files, results):
+        result["filename"] = file.filename
+    return JSONResponse(content={"results": results})
+
+
+def analyze_job_payload(payload, tiles=0):
+    # Job bodies are either scan matrix payloads or encoded images, as with /analyze/batch.
+    # Job workers aren't pool threads, so tiled jobs can fan out onto the pool directly.
+    key = result_cache.key(payload, tile_variant(tiles))
+    analyze = analyze_payload if is_matrix_payload(payload) else analyze_image
+    result = analyze(payload, tiles, executor.map)
+    result_cache.put(key, result)
+    return {"heuristic": result, "cached": False, "similar": similar_scans(result_cache.key(payload))}
+
+
+@app.post("/jobs")
+async def submit_job(request: Request, priority: int = 10, tiles: int = 0):
+    # Lower priority numbers run first; a full queue answers 429 with Retry-After
+    payload = await request.body()
+    if not payload:
+        raise HTTPException(status_code=400, detail="Empty job body")
+    cached = result_cache.get(result_cache.key(payload, tile_variant(tiles)))
+    if cached is not None:
+        similar = await asyncio.to_thread(similar_scans, result_cache.key(payload))
+        job = job_queue.add_finished({"heuristic": cached, "cached": True, "similar": similar}, priority)
+        return JSONResponse(content=job.info())
+    try:
+        job = job_queue.submit(partial(analyze_job_payload, tiles=tiles), payload, priority)
+    except QueueFull as e:
+        return JSONResponse(status_code=429, headers={"Retry-After": str(e.retry_after)},
+                            content={"detail": str(e), "retry_after": e.retry_after})
+    return JSONResponse(status_code=202, content=job.info(), headers={"Location": f"/jobs/{job.id}"})
+
+
+@app.get("/jobs/stats")
+async def job_stats():
+    return JSONResponse(content=job_queue.stats())
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    # wait > 0 long-polls: the response comes as soon as the job finishes, or after wait seconds
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    if wait > 0 and not job.done.is_set():
+        # Woken from the worker thread through the loop, so a parked poll holds no thread
+        loop = asyncio.get_running_loop()
+        finished = asyncio.Event()
+        callback = lambda job: loop.call_soon_threadsafe(finished.set)
+        job.add_done_callback(callback)
+        try:
+            await asyncio.wait_for(finished.wait(), min(wait, MAX_JOB_WAIT))
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            job.remove_done_callback(callback)
+    return JSONResponse(content=job.info())
+
+
+@app.get("/metrics")
+async def export_metrics():
+    # Queue, cache and stream state is read at scrape time rather than tracked on every change
+    for prefix, stats, totals in (("jobs", job_queue.stats(), JOB_TOTALS), ("cache", result_cache.stats(), CACHE_TOTALS)):
+        for name, value in stats.items():
+            if name in totals:
+                metrics.set_total(f"{prefix}_{name}_total", value)
+            elif isinstance(value, (int, float)):
+                metrics.set(f"{prefix}_{name}", value)
+    for name, value in similarity_index.stats().items():
+        metrics.set(f"similarity_index_{name}", value)
+    metrics.set("stream_sessions", len(stream_sessions))
+    metrics.set("profiler_enabled", int(profiler.enabled))
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profile")
+async def profile_stacks():
+    # Collapsed stacks ("outer;...;inner count") for flamegraph.pl or speedscope
+    return PlainTextResponse(profiler.collapsed())
+
+
+@app.post("/debug/profile")
+async def set_profiler(enabled: bool, interval: float = None, reset: bool = False):
+    if reset:
+        profiler.reset()
+    if enabled:
+        profiler.start(interval)
+    else:
+        await asyncio.to_thread(profiler.stop)
+    return JSONResponse(content=profiler.stats())
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return JSONResponse(content=result_cache.stats())
+
+
+@app.get("/similar/stats")
+async def similarity_stats():
+    return JSONResponse(content=similarity_index.stats())
+
+
+@app.post("/scan/stream")
+async def open_scan_stream(width: int = None, reverse: bool = False):
+    # reverse=true: rows will be sent in decreasing Y (a scan started at the far end)
+    return JSONResponse(content={"session_id": stream_sessions.create(width, reverse)})
+
+
+def add_stream_rows(scan, payload):
+    with metrics.time("analysis_decode_seconds", kind="stream"):
+        rows = decode_matrix(payload)
+    if len(rows) == 0:
+        raise ValueError("rows payload contains no rows")
+    with metrics.time("analysis_features_seconds", kind="stream"):
+        for row in rows:
+            provisional = scan.add_row(row)
+    return provisional
+
+
+@app.post("/scan/stream/{session_id}/rows")
+async def add_scan_rows(session_id: str, request: Request):
+    # Body is a common.scan_payload matrix holding one or more new rows
+    scan = stream_sessions.get(session_id)
+    if scan is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired scan stream")
+    payload = await request.body()
+    try:
+        provisional = await run_analysis(add_stream_rows, scan, payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return JSONResponse(content={"provisional": provisional})
+
+
+@app.post("/scan/stream/{session_id}/finish")
+async def finish_scan_stream(session_id: str, tiles: int = 0):
+    # tiles=N adds the same N x N region map as /analyze/raw, over the rows streamed
+    tile_variant(tiles)  # Rejects a bad tiles value before the session is used up
+    scan = stream_sessions.pop(session_id)
+    if scan is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired scan stream")
+    try:
+        result = scan.finish()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if tiles:
+        result["regions"] = await run_analysis(partial(tile_regions, tiles=tiles, map_func=executor.map),
+                                               scan.gray(), coordinator=True)
+
+    # Streamed scans have no upload to hash; they are indexed under their session id
+    def index_stream():
+        index_scan(session_id, scan.profile(), result)
+        return similar_scans(session_id)
+    similar = await asyncio.to_thread(index_stream)
+    return JSONResponse(content={"heuristic": result, "similar": similar})
 
-    result = analyze_with_heuristics(temp_path)
-    os.remove(temp_path)
 
-    return JSONResponse(content={"heuristic": result})
+@app.delete("/scan/stream/{session_id}")
+async def discard_scan_stream(session_id: str):
+    # For cancelled or failed scans: the session is dropped unscored and never indexed
+    scan = stream_sessions.pop(session_id)
+    if scan is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired scan stream")
+    return JSONResponse(content={"discarded": True, "rows": scan.rows})
@@ -0,0 +1,187 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+import uuid
+
+
+class QueueFull(Exception):
+    # Raised by JobQueue.submit when admitting the job would exceed the queue bound
+    def __init__(self, retry_after):
+        super().__init__(f"analysis queue is full; retry after {retry_after} s")
+        self.retry_after = retry_after
+
+
+class Job:
+    STATES = ("queued", "running", "done", "failed")
+
+    def __init__(self, func, payload, priority):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.payload = payload
+        self.priority = priority
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def add_done_callback(self, callback):
+        # callback(job) runs once the job finishes, on the finishing thread (now, if it already has)
+        with self._lock:
+            if not self.done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def remove_done_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def finish(self):
+        with self._lock:
+            self.done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def info(self):
+        info = {"job_id": self.id, "status": self.status, "priority": self.priority,
+                "submitted": self.submitted, "started": self.started, "finished": self.finished}
+        if self.started is not None:
+            info["queued_s"] = round(self.started - self.submitted, 4)
+        if self.finished is not None:
+            info["run_s"] = round(self.finished - self.started, 4)
+        if self.status == "done":
+            info["result"] = self.result
+        elif self.status == "failed":
+            info["error"] = self.error
+        return info
+
+
+class JobQueue:
+    """Priority queue of analysis jobs run by a fixed pool of worker threads.
+
+    Lower priority numbers run first; equal priorities run in submission
+    order. At most max_queued jobs wait at once; beyond that submit raises
+    QueueFull with a retry-after estimated from the backlog and the recent
+    run time, so a burst of scanners spreads out instead of piling onto the
+    server. Finished jobs are kept for ttl seconds so clients can poll for
+    the result, then dropped.
+    """
+
+    def __init__(self, workers=1, max_queued=64, ttl=600):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._heap = []
+        self._jobs = {}
+        self._order = itertools.count()
+        self._running = 0
+        self._average_run = None  # Exponential moving average of job run time (s)
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, daemon=True, name=f"job-worker-{i}")
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def retry_after(self):
+        # Time to work through half the backlog, so rejected clients come back spread out
+        average = self._average_run or 1.0
+        return max(1, math.ceil(average * (len(self._heap) + self._running) / self.workers / 2))
+
+    def submit(self, func, payload, priority=10):
+        job = Job(func, payload, priority)
+        with self._condition:
+            self._expire()
+            if len(self._heap) >= self.max_queued:
+                self.rejected += 1
+                raise QueueFull(self.retry_after())
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (priority, next(self._order), job))
+            self._condition.notify()
+        return job
+
+    def add_finished(self, result, priority=10):
+        # A job answered without queueing (e.g. from the result cache), so clients poll it the same way
+        job = Job(None, None, priority)
+        job.started = job.finished = job.submitted
+        job.status, job.result = "done", result
+        job.finish()
+        with self._condition:
+            self._expire()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._condition:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "workers": self.workers,
+                "queued": len(self._heap),
+                "running": self._running,
+                "max_queued": self.max_queued,
+                "retained": len(self._jobs),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "average_run_s": round(self._average_run, 4) if self._average_run is not None else None,
+            }
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [k for k, job in self._jobs.items() if job.finished is not None and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._heap and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                job = heapq.heappop(self._heap)[2]
+                self._running += 1
+            job.status, job.started = "running", time.time()
+            try:
+                job.result = job.func(job.payload)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            job.finished = time.time()
+            job.payload = None  # Results are retained for polling; uploads aren't
+            with self._condition:
+                self._running -= 1
+                run = job.finished - job.started
+                self._average_run = run if self._average_run is None else 0.8 * self._average_run + 0.2 * run
+                if job.status == "done":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            job.finish()
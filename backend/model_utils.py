@@ -1,27 +1,191 @@
 from PIL import Image
+import io
 import numpy as np
 import cv2
 
-def analyze_with_heuristics(image_path):
-    image = Image.open(image_path).convert('RGB')
-    image_np = np.array(image)
+# Full-scale sensor voltage mapped to 255 when scoring raw scan matrices,
+# so voltage grids land on the same 0-255 scale as the heatmap thresholds.
+VOLTAGE_FULL_SCALE = 3.3
+
+# Bump when the scoring logic changes; together with the thresholds below it
+# forms HEURISTIC_SIGNATURE, which keys cached results.
+HEURISTIC_VERSION = 1
+# (minimum brightness, object type, threat score), checked in order
+BRIGHTNESS_CLASSES = (
+    (200, "Highly Reflective Object (Metal)", 0.1),
+    (100, "Moderately Dense Object", 0.4),
+)
+DEFAULT_CLASS = ("Dense or Unknown Object", 0.75)
+
+HEURISTIC_SIGNATURE = f"v{HEURISTIC_VERSION}|{BRIGHTNESS_CLASSES}|{DEFAULT_CLASS}|{VOLTAGE_FULL_SCALE}"
+
+# Tiled analysis: regions listed by score, and the image size above which
+# tile features are computed in horizontal bands spread over map_func
+TOP_REGIONS = 3
+PARALLEL_BAND_PIXELS = 1 << 20
 
-    gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
-    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
-    brightness = np.mean(gray)
 
-    if brightness > 200:
-        obj_type = "Highly Reflective Object (Metal)"
-        threat = 0.1
-    elif brightness > 100:
-        obj_type = "Moderately Dense Object"
-        threat = 0.4
-    else:
-        obj_type = "Dense or Unknown Object"
-        threat = 0.75
+def classify(brightness, sharpness):
+    obj_type, threat = DEFAULT_CLASS
+    for minimum, class_type, class_threat in BRIGHTNESS_CLASSES:
+        if brightness > minimum:
+            obj_type, threat = class_type, class_threat
+            break
 
     return {
-        "sharpness": round(sharpness / 1000, 2),
+        "sharpness": round(float(sharpness) / 1000, 2),
         "object": obj_type,
         "threat_score": threat
     }
+
+
+def score_gray(gray, tiles=0, map_func=map):
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    brightness = np.mean(gray)
+    result = classify(brightness, sharpness)
+    if tiles:
+        result["regions"] = tile_regions(gray, tiles, map_func)
+    return result
+
+
+def tile_edges(size, count):
+    # Boundaries of count near-equal tiles along an axis (fewer if the axis is shorter)
+    return np.linspace(0, size, min(count, size) + 1).round().astype(int)
+
+
+def _band_features(gray, row_edges, col_edges):
+    # Per-tile sums of gray, gray^2, Laplacian and Laplacian^2 for the tile rows between
+    # row_edges[0] and row_edges[-1]. A one-row halo on each side keeps the band's
+    # Laplacian identical to the whole image's, reflect-101 border included.
+    r0, r1 = row_edges[0], row_edges[-1]
+    top, bottom = max(r0 - 1, 0), min(r1 + 1, gray.shape[0])
+    laplacian = cv2.Laplacian(gray[top:bottom], cv2.CV_64F)[r0 - top:r0 - top + r1 - r0]
+    band = gray[r0:r1]
+    planes = np.stack((band, band * band, laplacian, laplacian * laplacian))
+    sums = np.add.reduceat(planes, row_edges[:-1] - r0, axis=1)
+    return np.add.reduceat(sums, col_edges[:-1], axis=2)
+
+
+def tile_features(gray, tiles, map_func=map):
+    """Brightness, variance and Laplacian variance per tile of a tiles x tiles grid.
+
+    Computed from per-tile sums with np.add.reduceat, with no loop over
+    tiles. Images over PARALLEL_BAND_PIXELS are split into bands of tile
+    rows and the bands handed to map_func (an executor's map uses the cores).
+    Returns the three (tile rows, tile cols) arrays and the tile edges.
+    """
+    gray = np.asarray(gray, dtype=np.float64)
+    row_edges, col_edges = tile_edges(gray.shape[0], tiles), tile_edges(gray.shape[1], tiles)
+    bands = int(min(len(row_edges) - 1, max(1, gray.size // PARALLEL_BAND_PIXELS)))
+    splits = np.linspace(0, len(row_edges) - 1, bands + 1).round().astype(int)
+    parts = map_func(_band_features, [gray] * bands,
+                     [row_edges[a:b + 1] for a, b in zip(splits[:-1], splits[1:])], [col_edges] * bands)
+    sums = np.concatenate(list(parts), axis=1)
+
+    counts = np.outer(np.diff(row_edges), np.diff(col_edges))
+    brightness, laplacian_mean = sums[0] / counts, sums[2] / counts
+    variance = np.maximum(sums[1] / counts - brightness ** 2, 0)
+    sharpness = np.maximum(sums[3] / counts - laplacian_mean ** 2, 0)
+    return brightness, variance, sharpness, row_edges, col_edges
+
+
+def tile_regions(gray, tiles, map_func=map):
+    """Coarse threat map over a tiles x tiles grid and the highest-scoring regions.
+
+    Each tile is classified like a whole image, so a small object is scored
+    on its own tile instead of being averaged into an empty bed. Regions
+    are ranked by threat score, then by sharpness (structure beats flat).
+    """
+    brightness, variance, sharpness, row_edges, col_edges = tile_features(gray, tiles, map_func)
+    # First matching class wins, as in classify()
+    conditions = [brightness > minimum for minimum, _, _ in BRIGHTNESS_CLASSES]
+    index = np.select(conditions, range(len(BRIGHTNESS_CLASSES)), default=len(BRIGHTNESS_CLASSES))
+    classes = [(name, threat) for _, name, threat in BRIGHTNESS_CLASSES] + [DEFAULT_CLASS]
+    threat = np.array([threat for _, threat in classes])[index]
+
+    order = np.lexsort((-sharpness.ravel(), -threat.ravel()))[:TOP_REGIONS]
+    top = []
+    for flat in order:
+        row, col = divmod(int(flat), threat.shape[1])
+        top.append({
+            "row": row,
+            "col": col,
+            "bbox": [int(row_edges[row]), int(col_edges[col]), int(row_edges[row + 1]), int(col_edges[col + 1])],
+            "object": classes[index[row, col]][0],
+            "threat_score": float(threat[row, col]),
+            "brightness": round(float(brightness[row, col]), 2),
+            "variance": round(float(variance[row, col]), 2),
+            "sharpness": round(float(sharpness[row, col]) / 1000, 2),
+        })
+    return {
+        "grid": list(threat.shape),
+        "threat_map": threat.tolist(),
+        "max_threat": float(threat.max()),
+        "top": top,
+    }
+
+
+def decode_image(image):
+    # Accepts a file path or the encoded image bytes already held in memory
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        image = io.BytesIO(image)
+    image = Image.open(image).convert('RGB')
+    image_np = np.array(image)
+
+    return cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
+
+
+def analyze_with_heuristics(image, tiles=0, map_func=map):
+    """Score an image; tiles > 0 adds a tiles x tiles region threat map."""
+    return score_gray(decode_image(image), tiles, map_func)
+
+
+def voltages_to_gray(matrix):
+    volts = np.asarray(matrix, dtype=np.float64)
+    valid = ~np.isnan(volts)
+    if not valid.any():
+        raise ValueError("scan matrix contains no samples")
+
+    gray = np.clip(volts * (255 / VOLTAGE_FULL_SCALE), 0, 255)
+    # Padding from short rows takes the scan mean so it adds no false edges
+    gray[~valid] = gray[valid].mean()
+    return gray
+
+
+def analyze_matrix(matrix, tiles=0, map_func=map):
+    """Run the heuristics directly on a (rows, cols) voltage matrix."""
+    return score_gray(voltages_to_gray(matrix), tiles, map_func)
+
+
+def stack_features(grays):
+    """Brightness and Laplacian variance for same-shape images in one NumPy pass.
+
+    Matches cv2.Laplacian(ksize=1) with its default reflect-101 border.
+    """
+    stack = np.stack(grays).astype(np.float64)
+    padded = np.pad(stack, ((0, 0), (1, 1), (1, 1)), mode="reflect")
+    laplacian = (padded[:, :-2, 1:-1] + padded[:, 2:, 1:-1]
+                 + padded[:, 1:-1, :-2] + padded[:, 1:-1, 2:]
+                 - 4 * stack)
+    return stack.mean(axis=(1, 2)), laplacian.var(axis=(1, 2))
+
+
+def group_by_shape(grays, max_group=32):
+    # Index groups of equal-shape images, capped so stacks stay bounded in memory
+    groups = {}
+    for i, gray in enumerate(grays):
+        groups.setdefault(gray.shape, []).append(i)
+    return [indices[j:j + max_group]
+            for indices in groups.values()
+            for j in range(0, len(indices), max_group)]
+
+
+def analyze_batch(grays, map_func=map):
+    """Score many grayscale arrays; pass an executor's map to spread groups across cores."""
+    groups = group_by_shape(grays)
+    features = map_func(stack_features, [[grays[i] for i in indices] for indices in groups])
+    results = [None] * len(grays)
+    for indices, (brightness, sharpness) in zip(groups, features):
+        for i, b, s in zip(indices, brightness, sharpness):
+            results[i] = classify(b, s)
+    return results
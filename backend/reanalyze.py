@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from model_utils import analyze_batch, voltages_to_gray
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.scan_archive import ScanArchive, list_archives
+
+# Re-scores archived scans with the current heuristics, e.g. after a threshold
+# change:  python reanalyze.py "/path/to/KIVY GUI/scans" > results.jsonl
+# Archives that can't be scored get a {"archive", "skipped": reason} line instead.
+
+# Scans that never finished; their partial rows would be scored as if complete
+SKIPPED_STATUSES = ("cancelled", "failed")
+
+
+def load_gray(path):
+    # (grayscale scan, None), or (None, why it can't be scored)
+    try:
+        archive = ScanArchive(path)
+        status = archive.metadata.get("status")
+        if status in SKIPPED_STATUSES:
+            return None, f"scan {status}"
+        if len(archive) == 0:
+            return None, "no rows"
+        grid = archive.grid()
+        return voltages_to_gray(grid if grid is not None else archive.padded_matrix()), None
+    except (OSError, ValueError) as e:
+        return None, str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run the heuristics over a directory of scan archives")
+    parser.add_argument("directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    paths = list_archives(args.directory)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        loaded = list(executor.map(load_gray, paths))
+        scored = [i for i, (gray, _) in enumerate(loaded) if gray is not None]
+        results = dict(zip(scored, analyze_batch([loaded[i][0] for i in scored], map_func=executor.map)))
+
+    for i, (path, (_, reason)) in enumerate(zip(paths, loaded)):
+        if i in results:
+            print(json.dumps({"archive": os.path.basename(path), "heuristic": results[i]}))
+        else:
+            print(json.dumps({"archive": os.path.basename(path), "skipped": reason}))
+    if len(results) < len(paths):
+        print(f"Skipped {len(paths) - len(results)} of {len(paths)} archives", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
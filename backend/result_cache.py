@@ -0,0 +1,90 @@
+from collections import OrderedDict
+import hashlib
+import json
+import sqlite3
+import threading
+
+
+class ResultCache:
+    """LRU cache of analysis results keyed by a hash of the uploaded bytes.
+
+    The namespace (heuristic version and thresholds) is mixed into every key,
+    so changing the heuristics invalidates old entries. When path is given,
+    entries are also written to SQLite and reloaded on restart.
+    """
+
+    def __init__(self, max_entries=4096, namespace="", path=None):
+        self.max_entries = max_entries
+        self.namespace = namespace.encode()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS results "
+                         "(key TEXT PRIMARY KEY, value TEXT, used INTEGER)")
+        rows = self._db.execute("SELECT key, value FROM results ORDER BY used DESC LIMIT ?",
+                                (self.max_entries,)).fetchall()
+        for key, value in reversed(rows):
+            self._entries[key] = json.loads(value)
+        # Drop anything beyond the bound left by an earlier, larger configuration
+        self._db.execute("DELETE FROM results WHERE key NOT IN "
+                         "(SELECT key FROM results ORDER BY used DESC LIMIT ?)", (self.max_entries,))
+        self._db.commit()
+        self._clock = len(rows)
+
+    def key(self, payload, variant=""):
+        # variant separates results of the same upload analyzed with different options
+        digest = hashlib.blake2b(self.namespace + variant.encode(), digest_size=16)
+        digest.update(payload)
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            self.evictions += len(evicted)
+            if self._db is not None:
+                self._clock += 1
+                self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                                 (key, json.dumps(value), self._clock))
+                self._db.executemany("DELETE FROM results WHERE key = ?", [(k,) for k in evicted])
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
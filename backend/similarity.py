@@ -0,0 +1,150 @@
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+import cv2
+
+# Fingerprint: the scan area-averaged down to FINGERPRINT_SIDE^2 cells and
+# normalized to zero mean / unit spread (shape, not gain), followed by the
+# heuristic summary (brightness, sharpness, threat) weighted by SUMMARY_WEIGHT.
+# The whole vector is unit length, so a dot product is the cosine similarity.
+FINGERPRINT_SIDE = 16
+SUMMARY_WEIGHT = 0.5
+SHARPNESS_SCALE = 10.0  # Result sharpness (Laplacian variance / 1000) at which the feature saturates
+FINGERPRINT_DIM = FINGERPRINT_SIDE * FINGERPRINT_SIDE + 3
+
+
+def fingerprint(gray, result):
+    """Fixed-length unit vector for a 0-255 grayscale scan and its heuristic result."""
+    gray = np.asarray(gray, dtype=np.float32)
+    small = cv2.resize(gray, (FINGERPRINT_SIDE, FINGERPRINT_SIDE), interpolation=cv2.INTER_AREA)
+    spread = small.std()
+    shape = (small - small.mean()) / spread if spread > 1e-6 else np.zeros_like(small)
+    shape = shape.ravel() / FINGERPRINT_SIDE  # Unit norm when the spread is non-zero
+    summary = SUMMARY_WEIGHT * np.array([
+        float(gray.mean()) / 255,
+        min(result["sharpness"] / SHARPNESS_SCALE, 1.0),
+        result["threat_score"],
+    ], dtype=np.float32)
+    vector = np.concatenate((shape, summary))
+    return vector / max(np.linalg.norm(vector), 1e-6)
+
+
+class SimilarityIndex:
+    """Fingerprints of analyzed scans with exact top-k cosine search.
+
+    Vectors sit in one float32 matrix that doubles in capacity as it fills,
+    so an insert is a row copy and a query is one matrix-vector product plus
+    argpartition: a few milliseconds over tens of thousands of scans, with
+    no approximate structure to rebuild. Re-adding a key replaces its entry;
+    past max_entries the oldest is overwritten. When path is given, entries
+    are also written to SQLite and reloaded on restart, as in ResultCache.
+    """
+
+    def __init__(self, dim=FINGERPRINT_DIM, max_entries=100000, path=None):
+        self.dim = dim
+        self.max_entries = max_entries
+        self._vectors = np.zeros((min(1024, max_entries), dim), dtype=np.float32)
+        self._added = np.zeros(len(self._vectors))
+        self._keys = []
+        self._info = []
+        self._rows = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS fingerprints "
+                         "(key TEXT PRIMARY KEY, vector BLOB, info TEXT, added REAL)")
+        rows = self._db.execute("SELECT key, vector, info, added FROM fingerprints ORDER BY added DESC LIMIT ?",
+                                (self.max_entries,)).fetchall()
+        for key, vector, info, added in reversed(rows):
+            vector = np.frombuffer(vector, dtype="<f4")
+            if vector.size == self.dim:  # Entries from another fingerprint layout are skipped
+                self._insert(key, vector, json.loads(info), added)
+        self._db.execute("DELETE FROM fingerprints WHERE key NOT IN "
+                         "(SELECT key FROM fingerprints ORDER BY added DESC LIMIT ?)", (self.max_entries,))
+        self._db.commit()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _insert(self, key, vector, info, added):
+        # Returns the row written and the key it overwrote, if any
+        row, evicted = self._rows.get(key), None
+        if row is None:
+            if len(self._keys) < self.max_entries:
+                row = len(self._keys)
+                if row == len(self._vectors):
+                    capacity = min(2 * row, self.max_entries)
+                    self._vectors = np.resize(self._vectors, (capacity, self.dim))
+                    self._added = np.resize(self._added, capacity)
+                self._keys.append(key)
+                self._info.append(info)
+            else:
+                row = int(np.argmin(self._added[:len(self._keys)]))
+                evicted = self._keys[row]
+                del self._rows[evicted]
+                self._keys[row] = key
+            self._rows[key] = row
+        self._vectors[row] = vector
+        self._info[row] = info
+        self._added[row] = added
+        return row, evicted
+
+    def add(self, key, vector, info):
+        added = time.time()
+        info = dict(info, added=added)
+        with self._lock:
+            row, evicted = self._insert(key, vector, info, added)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?)",
+                                 (key, np.asarray(vector, dtype="<f4").tobytes(), json.dumps(info), added))
+                if evicted is not None:
+                    self._db.execute("DELETE FROM fingerprints WHERE key = ?", (evicted,))
+                self._db.commit()
+        return row
+
+    def nearest(self, vector, k, exclude=None):
+        # [{scan, similarity, **info}] for the k most similar entries, most similar first
+        with self._lock:
+            count = len(self._keys)
+            if count == 0 or k <= 0:
+                return []
+            scores = self._vectors[:count] @ np.asarray(vector, dtype=np.float32)
+            own = self._rows.get(exclude)
+            if own is not None:
+                scores[own] = -np.inf
+            k = min(k, count - (own is not None))
+            if k <= 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [dict(self._info[row], scan=self._keys[row], similarity=round(float(scores[row]), 4))
+                    for row in top]
+
+    def nearest_to(self, key, k):
+        # Neighbours of an indexed scan, itself excluded; [] if it isn't indexed
+        with self._lock:
+            row = self._rows.get(key)
+            vector = None if row is None else self._vectors[row].copy()
+        return [] if vector is None else self.nearest(vector, k, exclude=key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._keys),
+                "max_entries": self.max_entries,
+                "dim": self.dim,
+                "capacity": len(self._vectors),
+                "persistent": self._db is not None,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,154 @@
+import copy
+import threading
+import time
+import uuid
+import numpy as np
+import cv2
+from model_utils import classify, voltages_to_gray
+from similarity import FINGERPRINT_SIDE
+
+
+class RunningStats:
+    # Welford mean/variance, merged a block of values at a time
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, values):
+        n = values.size
+        if n == 0:
+            return
+        block_mean = float(values.mean())
+        block_m2 = float(((values - block_mean) ** 2).sum())
+        delta = block_mean - self.mean
+        total = self.count + n
+        self.mean += delta * n / total
+        self.m2 += block_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else 0.0
+
+
+class StreamingScan:
+    """Incremental heuristics over a scan that arrives one row at a time.
+
+    Brightness and Laplacian variance are accumulated as rows land over a
+    three-row window, so the final score is ready as soon as the last row
+    arrives. Rows are resampled to a common width (the first row's unless
+    given), and the Laplacian uses the same reflect-101 border as cv2. The
+    grayscale rows are kept too, for a region map over the whole scan.
+    reverse marks a scan whose rows arrive in decreasing Y; the scores
+    don't depend on the row order, but gray() puts the rows back in
+    increasing Y so regions land where an upload of the grid puts them.
+    """
+
+    def __init__(self, width=None, reverse=False):
+        self.width = width
+        self.reverse = reverse
+        self.rows = 0
+        self.brightness = RunningStats()
+        self.laplacian = RunningStats()
+        self._window = []
+        self._gray = []
+        self._profile = []  # Each row area-averaged to FINGERPRINT_SIDE columns, for the fingerprint
+        self._lock = threading.Lock()
+        self.updated = time.monotonic()
+
+    def _resample(self, row):
+        row = row[~np.isnan(row)]
+        if self.width is None:
+            self.width = row.size
+        if row.size == self.width:
+            return row
+        return np.interp(np.linspace(0, row.size - 1, self.width), np.arange(row.size), row)
+
+    def _row_laplacian(self, above, row, below):
+        padded = np.concatenate(([row[1]], row, [row[-2]])) if row.size > 1 else np.concatenate((row, row, row))
+        return above + below + padded[:-2] + padded[2:] - 4 * row
+
+    def add_row(self, voltages):
+        row = np.asarray(voltages, dtype=np.float64).ravel()
+        if not np.any(~np.isnan(row)):
+            raise ValueError("row contains no samples")
+        with self._lock:
+            gray = voltages_to_gray(self._resample(row))
+            self.brightness.update(gray)
+            self._gray.append(gray)
+            self._profile.append(cv2.resize(gray[np.newaxis], (FINGERPRINT_SIDE, 1), interpolation=cv2.INTER_AREA))
+            self._window.append(gray)
+            if len(self._window) == 2:
+                # First row: the row above reflects to the second row
+                first, second = self._window
+                self.laplacian.update(self._row_laplacian(second, first, second))
+            elif len(self._window) == 3:
+                above, middle, below = self._window
+                self.laplacian.update(self._row_laplacian(above, middle, below))
+                self._window.pop(0)
+            self.rows += 1
+            self.updated = time.monotonic()
+            return self.result()
+
+    def result(self):
+        return dict(classify(self.brightness.mean, self.laplacian.variance), rows=self.rows)
+
+    def finish(self):
+        with self._lock:
+            if self.rows == 0:
+                raise ValueError("no rows received")
+            laplacian = copy.copy(self.laplacian)
+            if len(self._window) == 1:
+                row = self._window[0]
+                laplacian.update(self._row_laplacian(row, row, row))
+            else:
+                # Last row: the row below reflects to the one above it
+                above, last = self._window[-2:]
+                laplacian.update(self._row_laplacian(above, last, above))
+            return dict(classify(self.brightness.mean, laplacian.variance), rows=self.rows)
+
+    def gray(self):
+        # The scan so far as a (rows, width) 0-255 grayscale image, rows in increasing Y
+        with self._lock:
+            gray = np.vstack(self._gray)
+        return gray[::-1] if self.reverse else gray
+
+    def profile(self):
+        # The scan at FINGERPRINT_SIDE columns, one row per row received and in increasing Y
+        # like gray(); enough to fingerprint it
+        with self._lock:
+            profile = np.vstack(self._profile)
+        return profile[::-1] if self.reverse else profile
+
+
+class StreamSessions:
+    # Open streaming scans by id; idle sessions are dropped after ttl seconds
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, width=None, reverse=False):
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            self._sessions[session_id] = StreamingScan(width, reverse)
+        return session_id
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def pop(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for session_id in [k for k, s in self._sessions.items() if s.updated < cutoff]:
+            del self._sessions[session_id]
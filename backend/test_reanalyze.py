@@ -0,0 +1,24 @@
+import json
+
+import numpy as np
+
+import reanalyze
+from common.scan_archive import ScanArchiveWriter
+
+
+def write_archive(path, rows, status="complete"):
+    writer = ScanArchiveWriter(str(path))
+    for i in range(rows):
+        writer.append_row(np.full(20, 1.2 + 0.1 * i), np.arange(20.0), np.arange(20.0), y_index=i, direction=1)
+    writer.close(status=status)
+
+
+def test_unscorable_archives_are_skipped_and_reported(tmp_path, monkeypatch, capsys):
+    write_archive(tmp_path / "a_good.scan", rows=4)
+    write_archive(tmp_path / "b_empty.scan", rows=0)
+    write_archive(tmp_path / "c_cancelled.scan", rows=2, status="cancelled")
+    monkeypatch.setattr("sys.argv", ["reanalyze.py", str(tmp_path)])
+    reanalyze.main()
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert "heuristic" in lines[0]
+    assert [line.get("skipped") for line in lines[1:]] == ["no rows", "scan cancelled"]
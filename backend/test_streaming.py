@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from model_utils import analyze_matrix, tile_regions, voltages_to_gray
+from streaming import StreamingScan, StreamSessions
+
+
+def scan_grid(rows=20, cols=110, seed=0):
+    # A noisy bed with one bright object, in volts
+    grid = 1.2 + np.random.default_rng(seed).normal(0, 0.05, (rows, cols))
+    grid[5:9, 40:60] += 1.5
+    return grid.astype(np.float32)
+
+
+@pytest.mark.parametrize("rows", [1, 2, 3, 20])
+def test_streamed_score_equals_batch_score(rows):
+    grid = scan_grid(rows)
+    scan = StreamingScan()
+    for row in grid:
+        scan.add_row(row)
+    streamed = scan.finish()
+    batch = analyze_matrix(grid)
+    assert streamed.pop("rows") == rows
+    assert streamed == batch
+
+
+def test_streamed_rows_give_the_batch_region_map():
+    grid = scan_grid()
+    scan = StreamingScan()
+    for row in grid:
+        scan.add_row(row)
+    assert tile_regions(scan.gray(), 4) == tile_regions(voltages_to_gray(grid), 4)
+
+
+def test_reverse_streamed_rows_give_the_batch_region_map():
+    grid = scan_grid()
+    scan = StreamingScan(reverse=True)
+    for row in grid[::-1]:
+        scan.add_row(row)
+    result = scan.finish()
+    result.pop("rows")
+    assert result == analyze_matrix(grid)
+    assert tile_regions(scan.gray(), 4) == tile_regions(voltages_to_gray(grid), 4)
+
+
+def test_reverse_streamed_profile_is_in_y_order():
+    grid = scan_grid()
+    forward, backward = StreamingScan(), StreamingScan(reverse=True)
+    for row, reversed_row in zip(grid, grid[::-1]):
+        forward.add_row(row)
+        backward.add_row(reversed_row)
+    assert np.array_equal(forward.profile(), backward.profile())
+
+
+def test_rows_are_resampled_to_the_first_width():
+    scan = StreamingScan()
+    scan.add_row(np.ones(10))
+    scan.add_row(np.r_[np.ones(20), np.nan])
+    assert scan.gray().shape == (2, 10)
+
+
+def test_rows_without_samples_are_rejected():
+    scan = StreamingScan()
+    with pytest.raises(ValueError):
+        scan.add_row([np.nan, np.nan])
+    with pytest.raises(ValueError):
+        scan.finish()
+
+
+def test_sessions_expire_when_idle():
+    sessions = StreamSessions(ttl=60)
+    session_id = sessions.create()
+    assert sessions.get(session_id) is not None
+    sessions.get(session_id).updated -= 120
+    sessions.create()  # Creating a session expires the idle ones
+    assert sessions.get(session_id) is None
@@ -0,0 +1,198 @@
+import bisect
+import collections
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency histogram bounds (s): sub-millisecond decodes up to multi-minute scans
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# How often the sampling profiler looks at every thread's stack, and how deep
+PROFILE_INTERVAL = 0.005
+PROFILE_MAX_DEPTH = 64
+
+
+@contextmanager
+def timed(record, key):
+    # Adds the block's wall time (s) to record[key]; repeated blocks accumulate
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record[key] = record.get(key, 0.0) + time.perf_counter() - start
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """Counters, gauges and latency histograms, exported in Prometheus text format.
+
+    Every update is a dict lookup and an add under one lock, cheap enough
+    for per-request and per-pass timing. Series are keyed by name and
+    labels; keep label values to a small fixed set (route templates, stage
+    names), never ids.
+    """
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._help = {}
+        self._counters = collections.defaultdict(float)
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def set_total(self, name, value, **labels):
+        # A counter whose running total is kept elsewhere and read at scrape time
+        with self._lock:
+            self._counters[(name, _label_key(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+            index = bisect.bisect_left(BUCKETS, seconds)
+            if index < len(BUCKETS):
+                histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    @contextmanager
+    def time(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+        lines = []
+        for kind, series in (("counter", counters), ("gauge", gauges), ("histogram", histograms)):
+            for name in sorted({name for name, _ in series}):
+                full_name = self.prefix + name
+                if name in self._help:
+                    lines.append(f"# HELP {full_name} {self._help[name]}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for (series_name, labels), value in sorted(series.items()):
+                    if series_name != name:
+                        continue
+                    if kind != "histogram":
+                        lines.append(f"{full_name}{_format_labels(labels)} {value:g}")
+                        continue
+                    buckets, total, count = value
+                    cumulative = 0
+                    for bound, bucket_count in zip(BUCKETS, buckets):
+                        cumulative += bucket_count
+                        lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {total:g}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """Statistical profiler that can be switched on and off in a running process.
+
+    While enabled, a background thread records every other thread's stack
+    each interval seconds; nothing is hooked into the profiled code, so
+    the cost is one stack walk per thread per sample and zero when off.
+    collapsed() returns the counts as "outer;...;inner count" lines, the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL, max_depth=PROFILE_MAX_DEPTH):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self.started = None
+        self._stacks = collections.Counter()
+        self._lock = threading.Lock()
+        self._stop_event = None
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self._thread is not None
+
+    def start(self, interval=None):
+        with self._lock:
+            if self._thread is not None:
+                return
+            if interval is not None:
+                self.interval = interval
+            self.started = time.time()
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop_event,), daemon=True, name="profiler")
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._stop_event.set()
+        thread.join()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def collapsed(self):
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def stats(self):
+        return {"enabled": self.enabled, "interval": self.interval, "samples": self.samples,
+                "stacks": len(self._stacks), "started": self.started}
+
+    def _run(self, stop_event):
+        own = threading.get_ident()
+        names = {}
+        while not stop_event.wait(self.interval):
+            threads = {thread.ident: thread.name for thread in threading.enumerate()}
+            sampled = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < self.max_depth:
+                    code = frame.f_code
+                    name = names.get(code)
+                    if name is None:
+                        name = names[code] = f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+                    frames.append(name)
+                    frame = frame.f_back
+                frames.append(threads.get(ident, "thread"))
+                sampled.append(";".join(reversed(frames)))
+            with self._lock:
+                self._stacks.update(sampled)
+                self.samples += 1
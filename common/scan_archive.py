@@ -0,0 +1,113 @@
+import json
+import os
+import numpy as np
+
+# A scan archive is a directory of flat little-endian arrays plus JSON
+# metadata. Rows are appended as they are acquired, so a scan that stops
+# midway is still readable, and every array can be memory-mapped.
+#   samples.f32     voltages of all rows, back to back
+#   timestamps.f64  acquisition time of each sample (seconds)
+#   positions.f32   X position of each sample (mm from the start of the pass)
+#   rows.i64        per row: sample offset, sample count, Y index, X direction
+#   grid.npy        resampled (rows, cols) float32 grid, written on close
+#   meta.json       scan settings, per-row stats and final status
+ARCHIVE_SUFFIX = ".scan"
+ROW_FIELDS = 4
+
+
+class ScanArchiveWriter:
+    def __init__(self, path, **metadata):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.metadata = dict(metadata, status="recording", row_stats=[])
+        self.offset = 0
+        self._files = {name: open(os.path.join(path, name), "ab")
+                       for name in ("samples.f32", "timestamps.f64", "positions.f32", "rows.i64")}
+        self._write_metadata()
+
+    def _write_metadata(self):
+        # Written to a temp file and renamed so readers never see half a JSON document
+        temp_path = os.path.join(self.path, "meta.json.tmp")
+        with open(temp_path, "w") as f:
+            json.dump(self.metadata, f)
+        os.replace(temp_path, os.path.join(self.path, "meta.json"))
+
+    def append_row(self, voltages, timestamps, positions, y_index, direction, stats=None):
+        count = len(voltages)
+        self._files["samples.f32"].write(np.asarray(voltages, dtype="<f4").tobytes())
+        self._files["timestamps.f64"].write(np.asarray(timestamps, dtype="<f8").tobytes())
+        self._files["positions.f32"].write(np.asarray(positions, dtype="<f4").tobytes())
+        self._files["rows.i64"].write(np.array([self.offset, count, y_index, direction], dtype="<i8").tobytes())
+        for f in self._files.values():
+            f.flush()
+        self.offset += count
+        self.metadata["row_stats"].append(stats or {})
+
+    def close(self, grid=None, status="complete", **metadata):
+        for f in self._files.values():
+            f.close()
+        if grid is not None:
+            np.save(os.path.join(self.path, "grid.npy"), np.asarray(grid, dtype="<f4"))
+        self.metadata.update(metadata, status=status)
+        self._write_metadata()
+
+
+def _map(path, dtype):
+    # np.memmap refuses empty files, which a scan with no rows yet has
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class ScanArchive:
+    """Read-only view of a scan archive; arrays are memory-mapped, not loaded."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.metadata = json.load(f)
+        self.samples = _map(os.path.join(path, "samples.f32"), "<f4")
+        self.timestamps = _map(os.path.join(path, "timestamps.f64"), "<f8")
+        self.positions = _map(os.path.join(path, "positions.f32"), "<f4")
+        index = _map(os.path.join(path, "rows.i64"), "<i8")
+        # A row being written when the scan stopped may be incomplete; drop it
+        self.index = index[:index.size // ROW_FIELDS * ROW_FIELDS].reshape(-1, ROW_FIELDS)
+        complete = self.index[:, 0] + self.index[:, 1] <= self.samples.size
+        self.index = self.index[complete]
+
+    def __len__(self):
+        return len(self.index)
+
+    def row(self, i):
+        """(voltages, timestamps, positions) views for row i in acquisition order."""
+        offset, count = self.index[i, 0], self.index[i, 1]
+        span = slice(offset, offset + count)
+        return self.samples[span], self.timestamps[span], self.positions[span]
+
+    def rows_by_y(self):
+        # Row numbers sorted into increasing Y, whichever way the scan ran
+        return np.argsort(self.index[:, 2], kind="stable")
+
+    def grid(self):
+        grid_path = os.path.join(self.path, "grid.npy")
+        if os.path.exists(grid_path):
+            return np.load(grid_path, mmap_mode="r")
+        return None
+
+    def padded_matrix(self):
+        # Rows in Y order, NaN-padded to the longest row (for archives without a grid)
+        order = self.rows_by_y()
+        width = int(self.index[:, 1].max()) if len(self) else 0
+        matrix = np.full((len(self), width), np.nan, dtype=np.float32)
+        for out_row, i in enumerate(order):
+            voltages = self.row(i)[0]
+            matrix[out_row, :voltages.size] = voltages
+        return matrix
+
+
+def list_archives(directory):
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(os.path.join(directory, name) for name in names if name.endswith(ARCHIVE_SUFFIX))
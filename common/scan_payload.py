@@ -0,0 +1,72 @@
+import struct
+import zlib
+import numpy as np
+
+# Compact wire format for raw scan matrices shared by the GUI and the backend:
+#   header  : magic, version, flags, row count
+#   body    : uint32 row lengths followed by the concatenated float32 samples
+# The body is optionally zlib-compressed (FLAG_ZLIB).
+MAGIC = b"SPTM"
+VERSION = 1
+FLAG_ZLIB = 0x01
+CONTENT_TYPE = "application/octet-stream"
+
+_HEADER = struct.Struct("<4sBBI")
+
+
+def is_matrix_payload(payload):
+    return payload[:len(MAGIC)] == MAGIC
+
+
+def encode_matrix(rows, compress=True):
+    if isinstance(rows, np.ndarray) and rows.ndim == 2:
+        # Fixed-shape grids go out as one contiguous block
+        lengths = np.full(rows.shape[0], rows.shape[1], dtype="<u4")
+        samples = rows.astype("<f4", copy=False)
+    elif len(rows):
+        lengths = np.array([len(row) for row in rows], dtype="<u4")
+        samples = np.concatenate([np.asarray(row, dtype="<f4").ravel() for row in rows])
+    else:
+        lengths = np.empty(0, dtype="<u4")
+        samples = np.empty(0, dtype="<f4")
+    body = lengths.tobytes() + samples.tobytes()
+    flags = 0
+    if compress:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_ZLIB
+    return _HEADER.pack(MAGIC, VERSION, flags, len(rows)) + body
+
+
+def decode_matrix(payload):
+    """Decode a payload into a float32 matrix, padding short rows with NaN."""
+    if len(payload) < _HEADER.size:
+        raise ValueError("payload too short for scan matrix header")
+    magic, version, flags, n_rows = _HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("not a scan matrix payload")
+    if version != VERSION:
+        raise ValueError(f"unsupported scan matrix version {version}")
+
+    body = payload[_HEADER.size:]
+    if flags & FLAG_ZLIB:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            raise ValueError(f"corrupt compressed payload: {e}")
+
+    lengths_size = 4 * n_rows
+    if len(body) < lengths_size:
+        raise ValueError("payload truncated in row index")
+    lengths = np.frombuffer(body, dtype="<u4", count=n_rows)
+    samples = np.frombuffer(body, dtype="<f4", offset=lengths_size)
+    if samples.size != int(lengths.sum()):
+        raise ValueError(f"expected {int(lengths.sum())} samples, got {samples.size}")
+
+    width = int(lengths.max()) if n_rows else 0
+    if n_rows and np.all(lengths == width):
+        return samples.reshape(n_rows, width).astype(np.float32)
+
+    matrix = np.full((n_rows, width), np.nan, dtype=np.float32)
+    mask = np.arange(width) < lengths[:, None]
+    matrix[mask] = samples
+    return matrix
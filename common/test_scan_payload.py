@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from common.scan_payload import encode_matrix, decode_matrix, is_matrix_payload
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_grid_round_trip(compress):
+    grid = np.random.default_rng(0).random((6, 11), dtype=np.float32)
+    payload = encode_matrix(grid, compress=compress)
+    assert is_matrix_payload(payload)
+    assert np.array_equal(decode_matrix(payload), grid)
+
+
+def test_ragged_rows_are_padded_with_nan():
+    matrix = decode_matrix(encode_matrix([[1.0, 2.0, 3.0], [4.0], []]))
+    assert matrix.shape == (3, 3)
+    assert np.array_equal(matrix[0], [1, 2, 3])
+    assert matrix[1, 0] == 4 and np.isnan(matrix[1, 1:]).all()
+    assert np.isnan(matrix[2]).all()
+
+
+def test_empty_payload_decodes_to_no_rows():
+    assert decode_matrix(encode_matrix([])).shape[0] == 0
+
+
+@pytest.mark.parametrize("payload", [
+    b"SPT",  # Shorter than the header
+    b"\x89PNG\r\n\x1a\n" + bytes(8),  # Not a matrix
+    encode_matrix([[1.0, 2.0]], compress=False)[:-4],  # Missing a sample
+])
+def test_malformed_payloads_are_rejected(payload):
+    with pytest.raises(ValueError):
+        decode_matrix(payload)
@@ -0,0 +1,250 @@
+import threading
+import time
+import numpy as np
+
+# Conversion rates supported by the ADS1115, in samples per second
+ADS1115_DATA_RATES = (8, 16, 32, 64, 128, 250, 475, 860)
+# adafruit_ads1x15's Mode.CONTINUOUS; the simulator's chips understand it too
+ADS1115_MODE_CONTINUOUS = 0x0000
+
+
+class SampleRing:
+    # Preallocated (timestamp, voltage) ring; count is the total ever written
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.voltages = np.empty(capacity, dtype=np.float32)
+        self.count = 0
+
+    def append(self, timestamp, voltage):
+        i = self.count % self.capacity
+        self.timestamps[i] = timestamp
+        self.voltages[i] = voltage
+        self.count += 1
+
+    def slice(self, start, stop):
+        # Copies samples [start, stop) out of the ring, unwrapping if needed
+        if start < stop - self.capacity:
+            raise ValueError("requested samples were already overwritten; enlarge the ring")
+        index = np.arange(start, stop) % self.capacity
+        return self.timestamps[index], self.voltages[index]
+
+
+class RowCapture:
+    def __init__(self, timestamps, voltages, dropped):
+        self.timestamps = timestamps
+        self.voltages = voltages
+        self.dropped = dropped
+        intervals = np.diff(timestamps)
+        duration = timestamps[-1] - timestamps[0] if timestamps.size > 1 else 0.0
+        self.achieved_rate = (timestamps.size - 1) / duration if duration > 0 else 0.0
+        self.jitter = float(intervals.std()) if intervals.size else 0.0
+
+    def stats(self):
+        return {
+            "samples": int(self.voltages.size),
+            "achieved_rate": round(float(self.achieved_rate), 2),
+            "jitter_ms": round(self.jitter * 1000, 3),
+            "dropped": self.dropped,
+        }
+
+
+class Sensor:
+    """One ADC input wired to a sensor on the scan head.
+
+    y_offset_mm is how far the sensor sits from the head's Y reference, in
+    the direction of increasing Y; the sensor at offset 0 is the reference.
+    """
+
+    def __init__(self, chan, ads=None, y_offset_mm=0.0, name=None):
+        if y_offset_mm < 0:
+            raise ValueError("sensor Y offsets are measured from the lowest sensor and can't be negative")
+        self.chan = chan
+        self.ads = ads
+        self.y_offset_mm = y_offset_mm
+        self.name = name or f"sensor {y_offset_mm:g} mm"
+
+
+class AdcSampleBus:
+    """Sole reader of the scan head's ADC inputs, publishing samples to any number of readers.
+
+    A single thread samples every sensor at the current rate, scheduling
+    each round of reads against absolute deadlines on a monotonic clock so
+    I2C and scheduling latency don't accumulate into a lower rate; rounds
+    missed entirely are counted as dropped. Every sensor has its own
+    preallocated ring and every sample its own timestamp. Readers (the UI,
+    scan recorders, diagnostics) only look at the rings, so they never issue
+    I2C transactions of their own and never block the sampler: there is one
+    writer, and the sample count is published after each write.
+
+    Sensors may share an ADS1115 (different inputs) or sit on several
+    ADS1115s at different I2C addresses. Reads are interleaved across chips
+    so one chip converts while the next is read. A chip with a single
+    sensor is put in continuous-conversion mode and each read just fetches
+    its latest conversion; a chip with several has to switch its
+    multiplexer per read, so its inputs share its data rate and the
+    per-sensor rate is capped at max_rate.
+    """
+
+    def __init__(self, sensors, sampling_rate, buffer_seconds=120):
+        self.sensors = list(sensors)
+        self.rings = [SampleRing(int(ADS1115_DATA_RATES[-1] * buffer_seconds)) for _ in self.sensors]
+        self.chips = {}  # id(ads) -> (ads, number of sensors on it)
+        for sensor in self.sensors:
+            if sensor.ads is not None:
+                ads, count = self.chips.get(id(sensor.ads), (sensor.ads, 0))
+                self.chips[id(sensor.ads)] = (ads, count + 1)
+        self.read_order = self._interleave()
+        busiest = max((count for _, count in self.chips.values()), default=1)
+        self.max_rate = ADS1115_DATA_RATES[-1] / busiest
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._previous_modes = {}
+        self.set_rate(sampling_rate)
+
+    def _interleave(self):
+        # Round-robin over chips: P0 of every chip, then P1 of every chip, ...
+        by_chip = {}
+        for i, sensor in enumerate(self.sensors):
+            by_chip.setdefault(id(sensor.ads), []).append(i)
+        queues = list(by_chip.values())
+        order = []
+        while any(queues):
+            for queue in queues:
+                if queue:
+                    order.append(queue.pop(0))
+        return order
+
+    @property
+    def ring(self):
+        # The reference sensor's ring, for single-sensor callers
+        return self.rings[0]
+
+    def set_rate(self, sampling_rate):
+        # Per-sensor rate; takes effect from the next deadline and is safe while running
+        if sampling_rate > self.max_rate:
+            print(f"{sampling_rate:g} SPS per sensor exceeds what {len(self.sensors)} sensors allow; "
+                  f"using {self.max_rate:g} SPS")
+            sampling_rate = self.max_rate
+        self.sampling_rate = sampling_rate
+        self.period = 1 / sampling_rate
+        if self._previous_modes:
+            self._apply_data_rates()
+
+    def _apply_data_rates(self):
+        for ads, count in self.chips.values():
+            wanted = self.sampling_rate * count
+            ads.data_rate = next((r for r in ADS1115_DATA_RATES if r >= wanted), ADS1115_DATA_RATES[-1])
+
+    def _enable_continuous(self):
+        for key, (ads, count) in self.chips.items():
+            self._previous_modes[key] = ads.mode
+            if count == 1:
+                ads.mode = ADS1115_MODE_CONTINUOUS
+        self._apply_data_rates()
+
+    def _restore_modes(self):
+        for key, mode in self._previous_modes.items():
+            self.chips[key][0].mode = mode
+        self._previous_modes = {}
+
+    def start(self):
+        self._enable_continuous()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._restore_modes()
+
+    def _run(self):
+        clock = time.perf_counter
+        channels = [(self.rings[i], self.sensors[i].chan) for i in self.read_order]
+        deadline = clock()
+        while not self._stop_event.is_set():
+            delay = deadline - clock()
+            if delay > 0:
+                time.sleep(delay)
+            for ring, chan in channels:
+                try:
+                    ring.append(clock(), chan.voltage)
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = e
+            period = self.period
+            deadline += period
+            behind = clock() - deadline
+            if behind >= period:
+                # Skip deadlines we can no longer meet rather than bursting to catch up
+                missed = int(behind // period)
+                self.dropped += missed
+                deadline += missed * period
+
+    def cursor(self, sensor=0):
+        return self.rings[sensor].count
+
+    def read_since(self, cursor, sensor=0):
+        # Samples published after cursor, and the cursor to pass next time
+        ring = self.rings[sensor]
+        count = ring.count
+        cursor = max(cursor, count - ring.capacity)
+        timestamps, voltages = ring.slice(cursor, count)
+        return timestamps, voltages, count
+
+    def latest(self, sensor=0):
+        ring = self.rings[sensor]
+        count = ring.count
+        if count == 0:
+            return None
+        i = (count - 1) % ring.capacity
+        return ring.timestamps[i], float(ring.voltages[i])
+
+    def window(self, seconds, sensor=0):
+        # Samples from the last `seconds`, newest last
+        ring = self.rings[sensor]
+        count = ring.count
+        wanted = min(count, ring.capacity, int(seconds * self.sampling_rate) + 1)
+        timestamps, voltages = ring.slice(count - wanted, count)
+        keep = timestamps >= timestamps[-1] - seconds if wanted else slice(None)
+        return timestamps[keep], voltages[keep]
+
+    def window_stats(self, seconds=1.0, sensor=0):
+        timestamps, voltages = self.window(seconds, sensor)
+        if voltages.size == 0:
+            return None
+        duration = timestamps[-1] - timestamps[0]
+        return {
+            "latest": float(voltages[-1]),
+            "mean": float(voltages.mean()),
+            "min": float(voltages.min()),
+            "max": float(voltages.max()),
+            "std": float(voltages.std()),
+            "rate": float((voltages.size - 1) / duration) if duration > 0 else 0.0,
+        }
+
+
+class RowRecorder:
+    # Marks scan passes off as rows on a shared bus; never touches the ADC itself
+    def __init__(self, bus):
+        self.bus = bus
+        self._row_start = None
+
+    def begin_row(self):
+        self._row_start = ([ring.count for ring in self.bus.rings], self.bus.dropped)
+
+    def end_row(self):
+        # One capture per sensor, in the bus's sensor order
+        starts, dropped = self._row_start
+        self._row_start = None
+        captures = []
+        for ring, start in zip(self.bus.rings, starts):
+            timestamps, voltages = ring.slice(start, ring.count)
+            captures.append(RowCapture(timestamps, voltages, self.bus.dropped - dropped))
+        return captures
@@ -0,0 +1,106 @@
+import warnings
+import numpy as np
+
+# Coarse passes are this many fine lines apart
+COARSE_FACTOR = 4
+# Refinement samples this many times faster than the coarse raster (capped by the ADC bus)
+FINE_RATE_FACTOR = 4
+# A region is interesting when it stands out from the background by this many noise sigmas
+INTEREST_THRESHOLD = 6.0
+# Width (mm) of the X blocks a coarse line is split into when scoring regions
+REGION_WIDTH_MM = 10
+# At most this fraction of the gaps between coarse lines is refined; past it the
+# refinement would cost about as many passes as a full raster
+MAX_REFINED_FRACTION = 0.5
+
+
+def coarse_lines(total_lines, factor=COARSE_FACTOR):
+    # Every factor-th line, always including the last so the raster spans the whole bed
+    wanted = np.zeros(total_lines, dtype=bool)
+    wanted[::factor] = True
+    wanted[-1] = True
+    return wanted
+
+
+def background_noise(grid):
+    # Bed background (median) and a robust noise sigma (scaled median absolute deviation)
+    background = np.nanmedian(grid)
+    return background, 1.4826 * np.nanmedian(np.abs(grid - background)) + 1e-6
+
+
+def region_scores(grid, region_cols):
+    """Interest of each (line, X block) of a coarse grid, in noise sigmas.
+
+    A region scores by how far its mean sits from the bed's background
+    (the grid median) and by how much it varies inside, both relative to a
+    robust noise estimate, so the score doesn't depend on the sensor's gain
+    or offset.
+    """
+    background, noise = background_noise(grid)
+    n_blocks = -(-grid.shape[1] // region_cols)
+    padded = np.full((grid.shape[0], n_blocks * region_cols), np.nan, dtype=np.float64)
+    padded[:, :grid.shape[1]] = grid
+    regions = padded.reshape(grid.shape[0], n_blocks, region_cols)
+    with warnings.catch_warnings():
+        # Blocks with no samples are expected; nanmean/nanstd warn about them
+        warnings.simplefilter("ignore", RuntimeWarning)
+        offset = np.abs(np.nanmean(regions, axis=2) - background)
+        spread = np.nanstd(regions, axis=2)
+    return np.nan_to_num((offset + spread) / noise)
+
+
+def refine_lines(grid, lines, total_lines, pitch_mm=1.0, threshold=INTEREST_THRESHOLD,
+                 max_fraction=MAX_REFINED_FRACTION):
+    """Fine lines worth scanning, given a coarse grid whose rows sit on `lines`.
+
+    A gap between two neighbouring coarse lines is refined when a region on
+    either of them scores above threshold, or when the signal changes
+    sharply between them (an edge running along X). An interesting line
+    thus refines the gaps on both its sides, which covers an object's
+    outline. Only the highest-scoring max_fraction of the gaps is kept.
+    Lines already scanned are left out.
+    """
+    lines = np.asarray(lines)
+    region_cols = max(1, int(round(REGION_WIDTH_MM / pitch_mm)))
+    scores = region_scores(grid, region_cols).max(axis=1)
+    noise = background_noise(grid)[1]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        edges = np.nan_to_num(np.nanmax(np.abs(np.diff(grid, axis=0)), axis=1)) / noise
+
+    gap_scores = np.maximum(np.maximum(scores[:-1], scores[1:]), edges)
+    hot = gap_scores > threshold
+    limit = int(np.ceil(max_fraction * len(hot)))
+    if hot.sum() > limit:
+        hot[:] = False
+        hot[np.argsort(-gap_scores, kind="stable")[:limit]] = True
+    wanted = np.zeros(total_lines, dtype=bool)
+    for gap in np.flatnonzero(hot):
+        wanted[lines[gap]:lines[gap + 1] + 1] = True
+    wanted[lines] = False
+    return wanted
+
+
+def fill_missing_lines(grid):
+    """Linearly interpolate all-NaN rows from the measured rows above and below.
+
+    Merges a coarse raster and its refinements into one grid at the fine
+    pitch: refined areas keep every measured line, the background between
+    coarse lines is interpolated. Rows outside the measured range stay NaN.
+    """
+    measured = np.flatnonzero(~np.all(np.isnan(grid), axis=1))
+    if measured.size < 2:
+        return grid
+    filled = grid.copy()
+    gaps = np.setdiff1d(np.arange(measured[0], measured[-1] + 1), measured)
+    if gaps.size == 0:
+        return filled
+    above = measured[np.searchsorted(measured, gaps) - 1]
+    below = measured[np.searchsorted(measured, gaps)]
+    weight = ((gaps - above) / (below - above))[:, None]
+    # A NaN cell on one side falls back to the other side's value
+    top, bottom = grid[above], grid[below]
+    top = np.where(np.isnan(top), bottom, top)
+    bottom = np.where(np.isnan(bottom), top, bottom)
+    filled[gaps] = (1 - weight) * top + weight * bottom
+    return filled
@@ -0,0 +1,100 @@
+import random
+import threading
+import time
+
+# Scans waiting on a verdict go ahead of batch work (re-analysis runs at the default, 10)
+SCAN_PRIORITY = 0
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 35  # Longer than the server holds a long-poll (MAX_JOB_WAIT)
+POLL_WAIT = 10
+MAX_WAIT = 120  # Give up on a verdict after this long; the scan is still archived
+
+
+class AnalysisClient:
+    """Client for the backend's /jobs queue over one pooled keep-alive session.
+
+    analyze() submits a payload and long-polls for the result, waiting out
+    429 answers for the Retry-After the server suggests (plus jitter, so a
+    fleet of scanners doesn't come back in lockstep). Every request has a
+    timeout and the whole call gives up after max_wait, so a slow or
+    unreachable backend costs a bounded wait and an {"error": ...} result
+    rather than a hung scan. Backends without /jobs are sent the matrix on
+    the synchronous /analyze/raw instead.
+    """
+
+    def __init__(self, base_url, pool_size=4, max_wait=MAX_WAIT):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.max_wait = max_wait
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Created on first use so requests isn't imported at startup
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+                session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+                self._session = session
+            return self._session
+
+    def analyze(self, payload, content_type, priority=SCAN_PRIORITY, tiles=0, timing=None):
+        # tiles=N asks for an N x N region threat map alongside the whole-scan verdict.
+        # A timing dict, if given, gets the upload, queue and server run times (s).
+        import requests
+        timing = {} if timing is None else timing
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.max_wait
+        params = {"priority": priority, "tiles": tiles}
+        try:
+            job = self._submit(payload, content_type, params, deadline)
+            timing["upload_s"] = time.perf_counter() - start
+            if job is None:
+                timing["path"] = "/analyze/raw"
+                result = self._analyze_sync(payload, content_type, {"tiles": tiles})
+                timing["total_s"] = time.perf_counter() - start
+                return result
+            timing["path"] = "/jobs"
+            while job["status"] in ("queued", "running"):
+                wait = min(POLL_WAIT, deadline - time.monotonic())
+                if wait <= 0:
+                    return {"error": f"No verdict after {self.max_wait} s (job {job['job_id']} {job['status']})"}
+                response = self.session.get(f"{self.base_url}/jobs/{job['job_id']}", params={"wait": wait},
+                                            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+                response.raise_for_status()
+                job = response.json()
+            timing["total_s"] = time.perf_counter() - start
+            timing.update((key, job[key]) for key in ("queued_s", "run_s") if key in job)
+            if job["status"] == "failed":
+                return {"error": job.get("error", "analysis failed")}
+            return job["result"]
+        except requests.RequestException as e:
+            return {"error": str(e)}
+
+    def _submit(self, payload, content_type, params, deadline):
+        # The job as first reported, or None if the backend has no job queue
+        while True:
+            response = self.session.post(f"{self.base_url}/jobs", params=params, data=payload,
+                                         headers={"Content-Type": content_type},
+                                         timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            if response.status_code == 404:
+                return None
+            if response.status_code != 429:
+                response.raise_for_status()
+                return response.json()
+            retry_after = float(response.headers.get("Retry-After", 1))
+            delay = retry_after * random.uniform(1.0, 1.5)
+            if time.monotonic() + delay > deadline:
+                response.raise_for_status()
+            time.sleep(delay)
+
+    def _analyze_sync(self, payload, content_type, params):
+        response = self.session.post(f"{self.base_url}/analyze/raw", data=payload, params=params,
+                                     headers={"Content-Type": content_type},
+                                     timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        response.raise_for_status()
+        return response.json()
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import requests
+from adafruit_motor import stepper
+
+# Kivy parses sys.argv on import unless told not to; the scan module pulls it in
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+import scan
+from acquisition import AdcSampleBus
+from hardware import open_hardware
+from heatmap_render import save_png_async
+from motion import plan_trapezoid, run_steps
+from position import PositionTracker
+from resample import resample_rows
+from simulator import Simulation, STEP_LATENCY_S, I2C_READ_LATENCY_S, NOISE_V
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.scan_payload import encode_matrix, CONTENT_TYPE
+
+# End-to-end benchmarks of the scan pipeline on the simulator, saved as JSON
+# so a change can be compared against an earlier run:
+#   python benchmark.py --output before.json
+#   python benchmark.py --compare before.json
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results")
+
+# Which way is better for each metric; anything else is reported but never flagged
+METRICS = {
+    "adc_achieved_rate_sps": "higher",
+    "adc_jitter_ms": "lower",
+    "adc_dropped": "lower",
+    "step_jitter_ms": "lower",
+    "step_max_late_ms": "lower",
+    "x_pass_s": "lower",
+    "rows_per_minute": "higher",
+    "scan_s": "lower",
+    "scan_rms_error_v": "lower",
+    "render_ms": "lower",
+    "png_write_ms": "lower",
+    "analyze_raw_ms": "lower",
+    "analyze_png_ms": "lower",
+    "post_scan_s": "lower",
+    "scan_to_verdict_s": "lower",
+}
+
+
+def simulated_scanner(args, workdir):
+    # A fresh simulator with the head somewhere on the bed and its position unknown,
+    # homed the way the app does it so the benchmark starts from the scan origin
+    steps_per_mm = {"X": scan.STEPS_PER_MM, "Y": scan.STEPS_PER_MM, "Z": scan.Z_STEPS_PER_MM}
+    scan.head_position = PositionTracker(steps_per_mm, path=os.path.join(workdir, "position.json"))
+    simulation = Simulation(steps_per_mm, start_mm={"X": scan.X_TRAVEL_MM / 2, "Y": scan.Y_TRAVEL_MM / 2},
+                            travel_mm=scan.FRAME_TRAVEL_MM, step_latency=args.step_latency,
+                            i2c_latency=args.i2c_latency, noise=args.noise, seed=args.seed)
+    hardware = open_hardware(scan.ADC_SENSORS, simulation=simulation)
+    scan.move_to_scan_start(hardware.motor_x, hardware.motor_y, scan.STEPS_PER_MM, 0)
+    return hardware
+
+
+def bench_steps(hardware):
+    # One full X pass against its plan: how closely steps follow the trapezoid
+    steps = int(scan.X_TRAVEL_MM * scan.STEPS_PER_MM)
+    plan = plan_trapezoid(steps, scan.STEPS_PER_MM, scan.RASTER_SPEED_MM_S)
+    timeline = np.empty(steps)
+    start = time.perf_counter()
+    duration = run_steps(hardware.motor_x, stepper.FORWARD, plan, timeline=timeline)
+    run_steps(hardware.motor_x, stepper.BACKWARD, plan)  # Back to the start for the scan
+    late = (timeline - start) - plan
+    return {
+        "step_jitter_ms": float(np.std(np.diff(timeline) - np.diff(plan)) * 1000),
+        "step_max_late_ms": float(late.max() * 1000),
+        "x_pass_s": duration,
+        "x_pass_planned_s": float(plan[-1]),
+    }
+
+
+def bench_scan(hardware, args):
+    bus = AdcSampleBus(hardware.sensors, scan.IDLE_SAMPLING_RATE)
+    bus.start()
+    try:
+        start = time.perf_counter()
+        scan.move_in_zigzag_pattern(hardware.motor_x, hardware.motor_y, bus, args.rate, args.y_increment,
+                                    scan.STEPS_PER_MM, update_velocity=lambda x, y: None)
+        elapsed = time.perf_counter() - start
+    finally:
+        bus.stop()
+    stats = scan.row_stats
+    grid = scan.build_scan_grid(scan.data_matrix, scan.row_positions, scan.row_lines)
+    # Accuracy of the resampled (unsmoothed) rows against the phantom under the same lines
+    lines = np.asarray(scan.row_lines)
+    measured = resample_rows(scan.data_matrix, scan.row_positions, scan.X_TRAVEL_MM)
+    truth = hardware.simulation.phantom.grid(scan.X_TRAVEL_MM, scan.Y_TRAVEL_MM + args.y_increment * 2,
+                                             x0_mm=scan.X_HOME_MM)
+    truth = truth[(lines * args.y_increment).round().astype(int)]
+    valid = ~np.isnan(measured)
+    return grid, {
+        "adc_achieved_rate_sps": float(np.mean([s["achieved_rate"] for s in stats])),
+        "adc_jitter_ms": float(np.mean([s["jitter_ms"] for s in stats])),
+        "adc_dropped": int(sum(s["dropped"] for s in stats)),
+        "rows": len(scan.data_matrix),
+        "rows_per_minute": len(scan.data_matrix) / elapsed * 60,
+        "scan_s": elapsed,
+        "scan_rms_error_v": float(np.sqrt(np.mean((measured[valid] - truth[valid]) ** 2))),
+    }
+
+
+def bench_render(grid, repeats):
+    # Render is what the scan thread waits for; the PNG copy is written in the background
+    render_times, png_times = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        image_path, rgb, _ = scan.generate_heatmap(grid)
+        render_times.append(time.perf_counter() - start)
+    save_png_async(rgb, image_path).result()  # Wait out the writes generate_heatmap queued
+    for _ in range(repeats):
+        start = time.perf_counter()
+        save_png_async(rgb, image_path).result()
+        png_times.append(time.perf_counter() - start)
+    metrics = {"render_ms": float(np.median(render_times) * 1000), "png_write_ms": float(np.median(png_times) * 1000)}
+    return image_path, metrics
+
+
+def post_raw(session, url, grid):
+    response = session.post(f"{url}/analyze/raw", data=encode_matrix(grid),
+                            headers={"Content-Type": CONTENT_TYPE}, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def post_png(session, url, png_path):
+    with open(png_path, "rb") as image_file:
+        response = session.post(f"{url}/analyze", files={"file": image_file}, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def bench_analysis(grid, png_path, url, repeats):
+    # Round trips to a running backend; skipped (with the reason) when it isn't reachable
+    session = requests.Session()
+    results = {}
+    try:
+        for name, send in (("analyze_raw_ms", lambda: post_raw(session, url, grid)),
+                           ("analyze_png_ms", lambda: post_png(session, url, png_path))):
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                send()
+                times.append(time.perf_counter() - start)
+            results[name] = float(np.median(times) * 1000)
+
+        # What the scan thread does after the last row when rows weren't streamed
+        start = time.perf_counter()
+        final_grid = scan.build_scan_grid(scan.data_matrix, scan.row_positions, scan.row_lines)
+        scan.generate_heatmap(final_grid)
+        post_raw(session, url, final_grid)
+        results["post_scan_s"] = time.perf_counter() - start
+    except requests.RequestException as e:
+        results["analysis_error"] = str(e)
+    finally:
+        session.close()
+    return results
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        scan.IMAGE_DIRECTORY = workdir  # Heatmap PNGs from the benchmark are thrown away
+        hardware = simulated_scanner(args, workdir)
+        metrics = bench_steps(hardware)
+        grid, scan_metrics = bench_scan(hardware, args)
+        metrics.update(scan_metrics)
+        png_path, render_metrics = bench_render(grid, args.repeats)
+        metrics.update(render_metrics)
+        metrics.update(bench_analysis(grid, png_path, args.url, args.repeats))
+        if "post_scan_s" in metrics:
+            metrics["scan_to_verdict_s"] = metrics["scan_s"] + metrics["post_scan_s"]
+        # Let the queued PNG writes finish before their directory is removed
+        save_png_async(np.zeros((1, 1, 3), np.uint8), os.path.join(workdir, "drain.png")).result()
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "metrics": metrics,
+    }
+
+
+def compare(result, baseline, tolerance):
+    # Prints each metric against the baseline; returns the names that got worse by more than tolerance
+    regressions = []
+    for name, value in result["metrics"].items():
+        before = baseline["metrics"].get(name)
+        if not isinstance(value, (int, float)) or not isinstance(before, (int, float)):
+            continue
+        change = (value - before) / abs(before) if before else 0.0
+        worse = METRICS.get(name) == "higher" and change < -tolerance or \
+            METRICS.get(name) == "lower" and change > tolerance
+        if worse:
+            regressions.append(name)
+        print(f"{name:24s} {before:12.3f} -> {value:12.3f}  {change:+7.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scan pipeline on simulated hardware")
+    parser.add_argument("--rate", type=float, default=250, help="ADC sampling rate during the scan (SPS)")
+    parser.add_argument("--y-increment", type=float, default=10, help="Y pitch of the scan (mm)")
+    parser.add_argument("--step-latency", type=float, default=STEP_LATENCY_S, help="Simulated time per motor step (s)")
+    parser.add_argument("--i2c-latency", type=float, default=I2C_READ_LATENCY_S, help="Simulated ADC read time (s)")
+    parser.add_argument("--noise", type=float, default=NOISE_V, help="Simulated ADC noise (V, standard deviation)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=5, help="Repeats of the render and analysis timings")
+    parser.add_argument("--url", default=scan.ANALYSIS_URL, help="Backend for the /analyze round trips")
+    parser.add_argument("--output", help="Where to save the results (default: benchmark_results/<time>.json)")
+    parser.add_argument("--compare", help="Earlier results to compare against; exits 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    result = run(args)
+    output = args.output or os.path.join(RESULTS_DIRECTORY, datetime.now().strftime("bench_%Y-%m-%d_%H-%M-%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        for name, value in result["metrics"].items():
+            print(f"{name:24s} {value}")
+
+
+if __name__ == "__main__":
+    main()
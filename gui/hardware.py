@@ -0,0 +1,59 @@
+from acquisition import Sensor
+
+# MotorKit bonnets: X and Y steppers on the first, Z on the second
+MOTORKIT_ADDRESSES = (0x60, 0x61)
+
+
+class Hardware:
+    """The scanner's motors and ADC inputs, real or simulated.
+
+    Everything the scan pipeline touches goes through this: motors need
+    onestep(direction, style) and release(); sensors wrap anything with a
+    voltage attribute. simulation is set when the parts are simulated.
+    """
+
+    def __init__(self, motor_x, motor_y, motor_z, sensors, simulation=None):
+        self.motor_x = motor_x
+        self.motor_y = motor_y
+        self.motor_z = motor_z
+        self.sensors = sensors
+        self.simulation = simulation
+
+    @property
+    def simulated(self):
+        return self.simulation is not None
+
+
+def open_hardware(sensor_config, simulation=None):
+    """Motors and sensors from the I2C bus, or from simulation when one is given.
+
+    sensor_config lists (ADS1115 I2C address, input 0-3, Y offset in mm)
+    per sensor. The Blinka and Adafruit driver imports happen here, so the
+    rest of the pipeline loads and runs without them.
+    """
+    if simulation is not None:
+        motors = [simulation.motor(axis) for axis in ("X", "Y", "Z")]
+        return Hardware(*motors, sensors=open_adc_sensors(sensor_config, simulation=simulation),
+                        simulation=simulation)
+
+    from adafruit_motorkit import MotorKit
+    kit1 = MotorKit(address=MOTORKIT_ADDRESSES[0])
+    kit2 = MotorKit(address=MOTORKIT_ADDRESSES[1])
+    return Hardware(kit1.stepper1, kit1.stepper2, kit2.stepper1, sensors=open_adc_sensors(sensor_config))
+
+
+def open_adc_sensors(config, simulation=None):
+    # One ADS1115 per I2C address, shared by the sensors wired to its inputs
+    if simulation is None:
+        import board
+        import adafruit_ads1x15.ads1115 as ADS
+        from adafruit_ads1x15.analog_in import AnalogIn
+    chips = {}
+    sensors = []
+    for address, pin, y_offset_mm in config:
+        if address not in chips:
+            chips[address] = simulation.adc(address) if simulation else ADS.ADS1115(board.I2C(), address=address)
+        ads = chips[address]
+        chan = simulation.channel(ads, pin, y_offset_mm) if simulation else AnalogIn(ads, pin)
+        sensors.append(Sensor(chan, ads=ads, y_offset_mm=y_offset_mm, name=f"0x{address:02x}/P{pin}"))
+    return sensors
@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import numpy as np
+
+# Control points of the "coolwarm" diverging colormap (blue -> grey -> red)
+COOLWARM = np.array([
+    (59, 76, 192), (98, 130, 234), (141, 176, 254), (184, 208, 249), (221, 221, 221),
+    (245, 196, 173), (244, 154, 123), (222, 96, 77), (180, 4, 38),
+], dtype=np.float64)
+LUT_SIZE = 256
+NAN_COLOR = (0, 0, 0)  # Unsampled cells blend into the black image background
+ARCHIVE_SCALE = 8  # Upscaling for the saved PNG so it stays readable in Previous Scans
+
+
+def build_lut(points, size=LUT_SIZE):
+    stops = np.linspace(0, 1, len(points))
+    levels = np.linspace(0, 1, size)
+    return np.stack([np.interp(levels, stops, points[:, c]) for c in range(3)], axis=1).round().astype(np.uint8)
+
+
+COLORMAP_LUT = build_lut(COOLWARM)
+
+# PNG encoding is the slow part of archiving, so it runs off the render path
+_png_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="png-writer")
+
+
+def color_range(grid):
+    if not np.any(~np.isnan(grid)):
+        return 0.0, 1.0
+    vmin, vmax = float(np.nanmin(grid)), float(np.nanmax(grid))
+    return (vmin, vmax) if vmax > vmin else (vmin, vmin + 1e-6)
+
+
+def colorize(grid, vmin, vmax, lut=COLORMAP_LUT):
+    """Map a voltage grid to an (rows, cols, 3) uint8 RGB array through the LUT."""
+    scale = (len(lut) - 1) / (vmax - vmin)
+    valid = ~np.isnan(grid)
+    index = np.zeros(grid.shape, dtype=np.intp)
+    np.clip((grid - vmin) * scale, 0, len(lut) - 1, out=index, where=valid, casting="unsafe")
+    rgb = lut[index]
+    rgb[~valid] = NAN_COLOR
+    return rgb
+
+
+def save_png_async(rgb, path, scale=ARCHIVE_SCALE):
+    def write():
+        from PIL import Image as PILImage
+        image = PILImage.fromarray(rgb)
+        image = image.resize((rgb.shape[1] * scale, rgb.shape[0] * scale), PILImage.BILINEAR)
+        # Renamed into place so directory watchers never see a half-written file
+        image.save(path + ".tmp", format="PNG")
+        os.replace(path + ".tmp", path)
+        print(f"Heatmap saved as {path}")
+
+    def report(future):
+        # Nobody waits on the write during a scan, so a failure would otherwise go unseen
+        if future.exception() is not None:
+            print(f"Could not save heatmap {path}: {future.exception()}")
+    future = _png_writer.submit(write)
+    future.add_done_callback(report)
+    return future
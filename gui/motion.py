@@ -0,0 +1,82 @@
+import time
+from functools import lru_cache
+import numpy as np
+from adafruit_motor import stepper
+
+# Full steps with both coils energised: same step size as SINGLE (so
+# steps_per_mm is unchanged) but the most holding torque, which lets the
+# motors run faster without losing position.
+STEP_STYLE = stepper.DOUBLE
+
+# Speed ramps start and end here, below the motors' pull-in speed
+START_SPEED_MM_S = 20.0
+ACCELERATION_MM_S2 = 800.0
+
+
+@lru_cache(maxsize=32)
+def plan_trapezoid(steps, steps_per_mm, max_speed, acceleration=ACCELERATION_MM_S2, start_speed=START_SPEED_MM_S):
+    """Time (s from the start of the move) at which each step should be issued.
+
+    Trapezoidal profile: accelerate from start_speed to max_speed (mm/s),
+    cruise, then decelerate symmetrically. Short moves that never reach
+    max_speed become a triangle. Plans are cached since every raster pass
+    uses the same one.
+    """
+    if steps <= 0:
+        return np.empty(0)
+    distance = np.arange(1, steps + 1) / steps_per_mm
+    total = steps / steps_per_mm
+    v0 = min(start_speed, max_speed)
+    if acceleration <= 0 or max_speed <= v0:
+        times = distance / max_speed
+        times.flags.writeable = False
+        return times
+
+    ramp = (max_speed ** 2 - v0 ** 2) / (2 * acceleration)
+    peak = max_speed
+    if 2 * ramp > total:
+        ramp = total / 2
+        peak = np.sqrt(v0 ** 2 + 2 * acceleration * ramp)
+    ramp_time = (peak - v0) / acceleration
+    end_time = 2 * ramp_time + (total - 2 * ramp) / peak
+
+    def time_to_cover(d):
+        return (np.sqrt(v0 ** 2 + 2 * acceleration * d) - v0) / acceleration
+
+    times = np.where(
+        distance <= ramp,
+        time_to_cover(np.minimum(distance, ramp)),
+        np.where(distance < total - ramp,
+                 ramp_time + (distance - ramp) / peak,
+                 end_time - time_to_cover(np.clip(total - distance, 0, ramp))))
+    times.flags.writeable = False
+    return times
+
+
+class MoveCancelled(Exception):
+    def __init__(self, steps_done):
+        super().__init__(f"move cancelled after {steps_done} steps")
+        self.steps_done = steps_done
+
+
+def run_steps(motor, direction, step_times, style=STEP_STYLE, cancel_event=None, timeline=None):
+    """Issue one step per planned time; returns the move's actual duration.
+
+    Every step is scheduled against the move's start on a monotonic clock, so
+    time spent in onestep (I2C) is absorbed by the next sleep instead of
+    adding up. If a step is late the following ones run back to back until
+    the schedule is caught up. Setting cancel_event stops the move between
+    steps (coils stay energised) and raises MoveCancelled.
+    """
+    clock = time.perf_counter
+    start = clock()
+    for steps_done, step_time in enumerate(step_times):
+        if cancel_event is not None and cancel_event.is_set():
+            raise MoveCancelled(steps_done)
+        delay = start + step_time - clock()
+        if delay > 0:
+            time.sleep(delay)
+        motor.onestep(direction=direction, style=style)
+        if timeline is not None:
+            timeline[steps_done] = clock()
+    return clock() - start
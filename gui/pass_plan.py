@@ -0,0 +1,35 @@
+import numpy as np
+
+
+def scan_rows(step_increment_y, travel_mm):
+    # Scan lines for a Y travel at the given pitch
+    total_y_increments = int(travel_mm / step_increment_y)
+    # Alternating passes stop once the Y travel is covered
+    return min(2 * total_y_increments, total_y_increments + 2)
+
+
+def plan_passes(total_lines, step_increment_y, y_offsets, wanted=None):
+    """Y position of each X pass and the scan lines its sensors record there.
+
+    Returns [(pass_y_mm, [(sensor, line), ...]), ...] in increasing Y, with
+    the head's Y taken at the lowest sensor. Each pass starts at the lowest
+    line not covered yet; a sensor that lands on a covered line or past the
+    last one records nothing. Offsets that are multiples of the Y increment
+    give every sensor a new line on (almost) every pass; other offsets are
+    rounded to the nearest line. wanted (a boolean mask over the lines)
+    limits the plan to some of the lines.
+    """
+    reference = min(y_offsets)
+    line_offsets = [int(round((offset - reference) / step_increment_y)) for offset in y_offsets]
+    covered = np.zeros(total_lines, dtype=bool) if wanted is None else ~np.asarray(wanted)
+    passes = []
+    while not covered.all():
+        base = int(np.argmin(covered))  # Lowest uncovered line
+        lines = []
+        for sensor, line_offset in enumerate(line_offsets):
+            line = base + line_offset
+            if line < total_lines and not covered[line]:
+                covered[line] = True
+                lines.append((sensor, line))
+        passes.append((base * step_increment_y, lines))
+    return passes
@@ -0,0 +1,53 @@
+import json
+import os
+from adafruit_motor import stepper
+
+POSITION_FILE = os.path.join(os.path.expanduser("~"), ".scanprotech_position.json")
+
+
+class PositionTracker:
+    """Absolute head position in steps, counted from every move.
+
+    The position is saved with an in_motion flag set while a scan runs; if the
+    app stops mid-scan the flag is still set on the next start and the
+    position is treated as unknown, so the caller falls back to full homing.
+    """
+
+    def __init__(self, steps_per_mm, path=POSITION_FILE):
+        self.steps_per_mm = steps_per_mm  # {"X": ..., "Y": ..., "Z": ...}
+        self.path = path
+        self.steps = {axis: 0 for axis in steps_per_mm}
+        self.known = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        if saved.get("in_motion", True):
+            return
+        self.steps.update({axis: int(saved["steps"].get(axis, 0)) for axis in self.steps})
+        self.known = True
+
+    def save(self, in_motion=False):
+        try:
+            with open(self.path, "w") as f:
+                json.dump({"steps": self.steps, "in_motion": in_motion}, f)
+        except OSError as e:
+            print(f"Could not save head position: {e}")
+
+    def record(self, axis, steps, direction):
+        self.steps[axis] += steps if direction == stepper.FORWARD else -steps
+
+    def set_mm(self, axis, mm):
+        self.steps[axis] = int(round(mm * self.steps_per_mm[axis]))
+
+    def mm(self, axis):
+        return self.steps[axis] / self.steps_per_mm[axis]
+
+    def steps_to(self, axis, target_mm):
+        # (steps, direction) to bring an axis to an absolute position
+        delta = int(round(target_mm * self.steps_per_mm[axis])) - self.steps[axis]
+        return abs(delta), stepper.FORWARD if delta >= 0 else stepper.BACKWARD
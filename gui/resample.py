@@ -0,0 +1,52 @@
+import numpy as np
+
+GRID_PITCH_MM = 1.0
+
+
+def sample_positions(sample_times, step_times, steps_per_mm, reverse=False, travel_mm=110):
+    """X position (mm from the start of the pass) of each sample.
+
+    step_times holds when each step of the pass completed, on the same clock
+    as the sample timestamps; positions between steps are interpolated.
+    """
+    travelled = np.interp(sample_times, step_times, np.arange(1, len(step_times) + 1) / steps_per_mm)
+    return travel_mm - travelled if reverse else travelled
+
+
+def resample_rows(rows, positions, travel_mm, pitch_mm=GRID_PITCH_MM, row_index=None, n_rows=None):
+    """Interpolate every row's samples onto fixed X cells.
+
+    Each cell takes the row's value at the cell centre, linearly
+    interpolated between the samples either side of it. Returns a
+    (rows, travel_mm / pitch_mm) float32 grid; cells outside a row's first
+    and last sample position are NaN. row_index places each row on a grid
+    row (default: in order), and n_rows sizes the grid so unscanned rows
+    stay NaN.
+    """
+    if row_index is None:
+        row_index = np.arange(len(rows))
+    if n_rows is None:
+        n_rows = int(np.max(row_index)) + 1 if len(rows) else 0
+    n_cols = int(round(travel_mm / pitch_mm))
+    centres = (np.arange(n_cols) + 0.5) * pitch_mm
+    grid = np.full((n_rows, n_cols), np.nan, dtype=np.float32)
+    for index, row, position in zip(row_index, rows, positions):
+        position = np.asarray(position, dtype=np.float64)
+        if position.size == 0:
+            continue
+        order = np.argsort(position, kind="stable")  # Backward passes run from high X to low
+        position, row = position[order], np.asarray(row, dtype=np.float64)[order]
+        inside = (centres >= position[0]) & (centres <= position[-1])
+        grid[index, inside] = np.interp(centres[inside], position, row)
+    return grid
+
+
+def smooth_grid(grid, sigma=1):
+    # Normalized convolution: empty cells neither drag neighbours toward zero nor get invented far from data
+    from scipy.ndimage import gaussian_filter  # Slow to import; preloaded behind the splash
+    valid = ~np.isnan(grid)
+    weighted = gaussian_filter(np.where(valid, grid, 0).astype(np.float32), sigma)
+    weights = gaussian_filter(valid.astype(np.float32), sigma)
+    smoothed = np.full(grid.shape, np.nan, dtype=np.float32)
+    np.divide(weighted, weights, out=smoothed, where=weights > 1e-3)
+    return smoothed
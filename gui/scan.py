@@ -1,82 +1,269 @@
 
 import random
 import time
+STARTED = time.perf_counter()  # Reference point for the startup profile; taken before the heavy imports
 import os
-import board
 import threading 
-from adafruit_motorkit import MotorKit
 from adafruit_motor import stepper
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.anchorlayout import AnchorLayout
 from kivy.uix.button import Button
+from kivy.uix.togglebutton import ToggleButton
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 from kivy.uix.screenmanager import ScreenManager, Screen
-from kivy.uix.scrollview import ScrollView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recyclegridlayout import RecycleGridLayout
 from kivy.uix.image import Image
 from kivy.clock import Clock
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
-from scipy.ndimage import gaussian_filter
 from datetime import datetime
 from kivy.core.window import Window
 from kivy.uix.widget import Widget
 from kivy.graphics import Color, Rectangle
+from kivy.graphics.texture import Texture
 from kivy.uix.floatlayout import FloatLayout
-import requests
+import sys
+import queue
+import json
+import signal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.scan_payload import encode_matrix, CONTENT_TYPE
+from common.scan_archive import ScanArchiveWriter, ARCHIVE_SUFFIX
+from common.instrumentation import SamplingProfiler, timed
+from acquisition import AdcSampleBus, RowRecorder
+from hardware import open_hardware
+from motion import plan_trapezoid, run_steps, MoveCancelled
+from position import PositionTracker
+from resample import sample_positions, resample_rows, smooth_grid, GRID_PITCH_MM
+from pass_plan import scan_rows, plan_passes
+from adaptive import coarse_lines, refine_lines, fill_missing_lines, COARSE_FACTOR, FINE_RATE_FACTOR
+from scan_index import ScanIndex, ThumbnailCache
+from heatmap_render import colorize, color_range, save_png_async, COLORMAP_LUT
+from startup import StartupTracker, RetryingInit, preload_modules
+from analysis_client import AnalysisClient
+
+# requests, scipy.ndimage and PIL are imported where they are used, and
+# preloaded behind the splash; see startup.DEFERRED_MODULES
+startup = StartupTracker(STARTED)
+startup.mark("imports")
 
 
 # Global Variables
 data_matrix = []
 IMAGE_DIRECTORY = "/home/furdeengregg/Desktop/Senior Design Team & Gregg Data Collection/KIVY GUI"
+ARCHIVE_DIRECTORY = os.path.join(IMAGE_DIRECTORY, "scans")
+# One JSON timing record per scan (stages, passes, ADC, render, upload), appended here
+SCAN_TIMING_LOG = os.path.join(ARCHIVE_DIRECTORY, "timings.jsonl")
+# Sampling profiler: SCANPROTECH_PROFILE=1 starts it with the app; SIGUSR1 toggles it while running
+# (kill -USR1 <pid>) and, when switching it off, writes collapsed stacks here for a flame graph
+PROFILE_DIRECTORY = os.path.join(IMAGE_DIRECTORY, "profiles")
 current_x_velocity = 0
 current_y_velocity = 0.0
 x_velocities = []
 y_velocities = []
-
+row_timestamps = []  # perf_counter() time of each sample, aligned with data_matrix
+row_stats = []  # achieved rate, jitter and dropped samples per row
+row_positions = []  # X position (mm) of each sample, aligned with data_matrix
+row_lines = []  # Scan line (Y index) of each row of data_matrix
+pass_timings = []  # Per X pass: Y position, X and Y move times, samples and achieved ADC rate
+ANALYSIS_URL = "http://127.0.0.1:8000"
+ANALYSIS_TILES = 8  # Region grid (N x N) for the backend's threat map; 0 scores the whole scan only
+STEPS_PER_MM = 200 / (2 * 3.14 * 10)
+RASTER_SPEED_MM_S = 150.0  # Commanded X/Y speed; actual speed is logged per pass
+Z_SPEED_MM_S = 10.0
+IDLE_SAMPLING_RATE = 50  # ADC rate between scans, for the live readout
+ADC_DISPLAY_WINDOW = 1.0  # Seconds of samples behind the ADC statistics labels
+SPLASH_MAX_SECONDS = 20  # Show the main screen by then even if the hardware is still being retried
+Z_STEPS_PER_MM = 10
+X_TRAVEL_MM = 110
+Y_TRAVEL_MM = 130
+X_HOME_MM = 5  # reset_axes leaves X this far from the origin
+# Mechanical travel of the frame from the origin ends. Y has room past Y_TRAVEL_MM for
+# the extra lines scan_rows adds; the simulated head stops at these ends.
+FRAME_TRAVEL_MM = {"X": X_HOME_MM + X_TRAVEL_MM, "Y": 2 * Y_TRAVEL_MM}
+# Sensors on the scan head: (ADS1115 I2C address, input 0-3, Y offset in mm from the first sensor).
+# Each X pass records one line per sensor, so N sensors need about 1/N of the passes.
+ADC_SENSORS = (
+    (0x48, 0, 0.0),
+)
+# Set SCANPROTECH_SIMULATED=1 to run against simulated motors and ADCs instead of the I2C bus
+SIMULATED_HARDWARE = os.environ.get("SCANPROTECH_SIMULATED") == "1"
+
+# Where the head is, tracked across moves and persisted between scans
+head_position = PositionTracker({"X": STEPS_PER_MM, "Y": STEPS_PER_MM, "Z": Z_STEPS_PER_MM})
+# Set to stop every motor move between steps (scan abort)
+scan_cancel = threading.Event()
+# Set to end the zig-zag after the current pass and analyze what was scanned
+scan_stop_early = threading.Event()
+# Analysis requests go through the backend job queue on one pooled keep-alive session
+analysis_client = AnalysisClient(ANALYSIS_URL)
+profiler = SamplingProfiler()
+
+
+
+# Streams each finished row to the backend so analysis overlaps the scan
+class ScanStreamClient:
+    def __init__(self, base_url=ANALYSIS_URL, on_provisional=None, timeout=10):
+        self.base_url = base_url
+        self.on_provisional = on_provisional
+        self.timeout = timeout
+        self.session = analysis_client.session  # Shares the pooled connections to the backend
+        self.session_id = None
+        self.error = None
+        self.provisional = None
+        self.rows = queue.Queue()
+        self.thread = None
+
+    def start(self, reverse=False):
+        # reverse: rows will be sent in decreasing Y, so the backend flips them back for its region map
+        try:
+            response = self.session.post(f"{self.base_url}/scan/stream", params={"reverse": reverse},
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            self.session_id = response.json()["session_id"]
+        except Exception as e:
+            self.error = str(e)
+            return
+        self.thread = threading.Thread(target=self._send_rows, daemon=True)
+        self.thread.start()
+
+    def send_row(self, row):
+        # Called from the scan loop; never blocks on the network
+        if self.thread is not None:
+            self.rows.put(list(row))
+
+    def _send_rows(self):
+        while True:
+            row = self.rows.get()
+            if row is None:
+                return
+            if self.error:
+                continue
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/scan/stream/{self.session_id}/rows",
+                    data=encode_matrix([row], compress=False),
+                    headers={"Content-Type": CONTENT_TYPE},
+                    timeout=self.timeout)
+                response.raise_for_status()
+                self.provisional = response.json()["provisional"]
+                if self.on_provisional:
+                    self.on_provisional(self.provisional)
+            except Exception as e:
+                self.error = str(e)
+
+    def finish(self, tiles=0):
+        # Returns the final result, or None if streaming failed and a full upload is needed.
+        # tiles=N asks for the N x N region map, as analyze() does.
+        if self.thread is None:
+            return None
+        self.rows.put(None)
+        self.thread.join()
+        if self.error:
+            return None
+        try:
+            response = self.session.post(
+                f"{self.base_url}/scan/stream/{self.session_id}/finish", params={"tiles": tiles},
+                timeout=self.timeout)
+            return response.json() if response.ok else None
+        except Exception:
+            return None
+
+    def discard(self):
+        # Drops the session without a verdict, so a partial scan never joins the similarity index
+        if self.thread is None:
+            return
+        self.rows.put(None)
+        self.thread.join()
+        self.thread = None
+        try:
+            self.session.delete(f"{self.base_url}/scan/stream/{self.session_id}", timeout=self.timeout)
+        except Exception as e:
+            print(f"Could not discard scan stream: {e}")
 
 
 #Fucntion to Reset axes
-def reset_axes(motor_x, motor_y, steps_per_mm, travel_distance_x=110, travel_distance_y=130):
-    x_reset_distance = 5  # Stop 5 mm from origin
-    y_reset_distance = travel_distance_y
-
-    x_steps_to_reset = int((travel_distance_x - x_reset_distance) * steps_per_mm)
-    y_steps_to_reset = int(y_reset_distance * steps_per_mm)
+def reset_axes(motor_x, motor_y, steps_per_mm, travel_distance_x=FRAME_TRAVEL_MM["X"],
+               travel_distance_y=FRAME_TRAVEL_MM["Y"]):
+    # Full-travel homing against the ends, only needed when the position is unknown.
+    # With no limit switches, each axis is driven its whole travel toward the origin so
+    # it ends stalled against the end wherever it started.
+    x_steps_to_reset = int(travel_distance_x * steps_per_mm)
+    y_steps_to_reset = int(travel_distance_y * steps_per_mm)
 
     print("Resetting Y-axis to origin...")
-    move_motor(motor_y, y_steps_to_reset, stepper.BACKWARD)
+    move_motor(motor_y, y_steps_to_reset, stepper.BACKWARD, steps_per_mm=steps_per_mm)
     print("Y-axis reset complete.")
 
     print("Resetting X-axis to 5 mm from origin...")
-    move_motor(motor_x, x_steps_to_reset, stepper.BACKWARD)
+    move_motor(motor_x, x_steps_to_reset, stepper.BACKWARD, steps_per_mm=steps_per_mm)
+    head_position.set_mm("X", 0)
+    head_position.set_mm("Y", 0)
+    head_position.known = True
+    move_axis_to("X", motor_x, X_HOME_MM, steps_per_mm=steps_per_mm)
     print("X-axis reset complete.")
 
 
+# Go to the nearest corner of the scan area instead of homing every time
+def move_to_scan_start(motor_x, motor_y, steps_per_mm, last_pass_y):
+    if not head_position.known:
+        reset_axes(motor_x, motor_y, steps_per_mm)
+        return stepper.FORWARD, stepper.FORWARD
+
+    corners = [(x, y) for x in (X_HOME_MM, X_HOME_MM + X_TRAVEL_MM) for y in (0, last_pass_y)]
+    start_x, start_y = min(corners, key=lambda c: abs(c[0] - head_position.mm("X")) + abs(c[1] - head_position.mm("Y")))
+    print(f"Moving to scan start at X={start_x:.1f} mm, Y={start_y:.1f} mm...")
+    move_axis_to("Y", motor_y, start_y, steps_per_mm=steps_per_mm)
+    move_axis_to("X", motor_x, start_x, steps_per_mm=steps_per_mm)
+
+    x_direction = stepper.FORWARD if start_x == X_HOME_MM else stepper.BACKWARD
+    y_direction = stepper.FORWARD if start_y == 0 else stepper.BACKWARD
+    return x_direction, y_direction
+
+
 # Function to move the Z-axis actuator
 
-def move_third_actuator(motor_z, distance_mm, steps_per_mm=10):
-    print(f"Moving Z-axis by {distance_mm} mm...")
-    steps = int(distance_mm * steps_per_mm)
-    for _ in range(steps):
-        motor_z.onestep(direction=stepper.FORWARD)
-        time.sleep(0.01)
+def move_third_actuator(motor_z, height_mm, steps_per_mm=Z_STEPS_PER_MM):
+    print(f"Moving Z-axis to {height_mm} mm...")
+    move_axis_to("Z", motor_z, height_mm, speed=Z_SPEED_MM_S, steps_per_mm=steps_per_mm)
     print("Z-axis movement complete.") 
 
  
 
+def create_hardware():
+    if not SIMULATED_HARDWARE:
+        return open_hardware(ADC_SENSORS)
+    from simulator import Simulation
+    # The simulated head starts where the tracker last saw the real one
+    start_mm = {axis: head_position.mm(axis) for axis in head_position.steps_per_mm}
+    return open_hardware(ADC_SENSORS, simulation=Simulation(head_position.steps_per_mm, start_mm=start_mm,
+                                                            travel_mm=FRAME_TRAVEL_MM))
+
+
 # Fucntion Move Motor
-def move_motor(motor, steps, direction):
-    start_time = time.time()
-    for _ in range(steps):
-        motor.onestep(direction = direction)
-        time.sleep(0.002)
-    end_time = time.time()
-    return end_time - start_time
+def move_motor(motor, steps, direction, speed=RASTER_SPEED_MM_S, steps_per_mm=STEPS_PER_MM, timeline=None):
+    step_times = plan_trapezoid(steps, steps_per_mm, speed)
+    return run_steps(motor, direction, step_times, cancel_event=scan_cancel, timeline=timeline)
+
+
+def move_axis(axis, motor, steps, direction, **kwargs):
+    try:
+        duration = move_motor(motor, steps, direction, **kwargs)
+    except MoveCancelled as e:
+        # Count the steps actually taken so the position stays valid after an abort
+        head_position.record(axis, e.steps_done, direction)
+        raise
+    head_position.record(axis, steps, direction)
+    return duration
+
+
+def move_axis_to(axis, motor, target_mm, **kwargs):
+    steps, direction = head_position.steps_to(axis, target_mm)
+    return move_axis(axis, motor, steps, direction, **kwargs)
 
 # Helper to safely schedule velocity updates from threads
 def update_velocity_scheduled(xv, yv, update_velocity):
@@ -87,89 +274,93 @@ def update_velocity_scheduled(xv, yv, update_velocity):
 
 
         
-# Function to continuously read ADC in a separate thread
-def acquire_adc_data(chan, sampling_rate, data_list, stop_event):
-    interval = 1 / sampling_rate  # How often to sample ADC
-    while not stop_event.is_set():
-        data_list.append(chan.voltage)  # Read actual ADC value
-        time.sleep(interval)  # Sleep based on sampling rate
-
 #Zig Zag Fucntion
-def move_in_zigzag_pattern(motor_x, motor_y, chan, sampling_rate, step_increment_y, steps_per_mm,update_velocity):
-    global data_matrix, x_velocities, y_velocities
-    data_matrix = []
+def move_in_zigzag_pattern(motor_x, motor_y, adc_bus, sampling_rate, step_increment_y, steps_per_mm,update_velocity, on_row=None,
+                           x_direction=stepper.FORWARD, y_direction=stepper.FORWARD, passes=None, append=False):
+    global data_matrix, x_velocities, y_velocities, row_timestamps, row_stats, row_positions, row_lines, pass_timings
+    if not append:  # append adds a further set of passes to the rows already recorded
+        pass_timings = []
+        data_matrix = []
+        row_timestamps = []
+        row_stats = []
+        row_positions = []
+        row_lines = []
+        x_velocities = []
+        y_velocities = []
     print(f"Starting zig-zag scan with sampling rate {sampling_rate} Hz and Y-axis increment {step_increment_y} mm...")
 
-    total_x_steps = int(110 * steps_per_mm)
-    total_y_steps = int(step_increment_y * steps_per_mm)
-    total_y_increments = int(130 / step_increment_y)
-    y_increment_count = 0
-
-    stop_event = threading.Event()
+    if passes is None:
+        passes = plan_passes(scan_rows(step_increment_y, Y_TRAVEL_MM), step_increment_y,
+                             [sensor.y_offset_mm for sensor in adc_bus.sensors])
+    if y_direction == stepper.BACKWARD:
+        passes = passes[::-1]
+    total_x_steps = int(X_TRAVEL_MM * steps_per_mm)
+    reverse_x = stepper.BACKWARD if x_direction == stepper.FORWARD else stepper.FORWARD
+    step_clock = np.empty(total_x_steps)
+
+    # The shared ADC bus runs at the scan rate; each X pass is marked off as one row per sensor
+    idle_rate = adc_bus.sampling_rate
+    adc_bus.set_rate(sampling_rate)
+    acquisition = RowRecorder(adc_bus)
+    try:
+        if passes:
+            move_axis_to("Y", motor_y, passes[0][0], steps_per_mm=steps_per_mm)  # No-op unless appending
+        for i, (pass_y, lines) in enumerate(passes):
+            if scan_stop_early.is_set():
+                print(f"Scan stopped early after {i} of {len(passes)} passes.")
+                break
+            direction = x_direction if i % 2 == 0 else reverse_x
+            acquisition.begin_row()
+            duration = move_axis("X", motor_x, total_x_steps, direction, steps_per_mm=steps_per_mm, timeline=step_clock)
+            captures = acquisition.end_row()
+
+            # Samples from every sensor share the pass's step timeline
+            for sensor, line in lines:
+                row = captures[sensor]
+                # Rows are stored in increasing X whichever way the head travelled
+                voltages, timestamps = row.voltages, row.timestamps
+                positions = sample_positions(timestamps, step_clock, steps_per_mm,
+                                             reverse=direction == stepper.BACKWARD, travel_mm=X_TRAVEL_MM)
+                if direction == stepper.BACKWARD:
+                    voltages, timestamps, positions = voltages[::-1], timestamps[::-1], positions[::-1]
+                data_matrix.append(voltages)
+                row_timestamps.append(timestamps)
+                row_positions.append(positions)
+                row_stats.append(dict(row.stats(), sensor=sensor))
+                row_lines.append(line)
+                if on_row:
+                    on_row(line, voltages, timestamps, positions, direction == stepper.FORWARD, row_stats[-1])
+
+            x_velocity = 110 / duration if duration > 0 else 0
+            x_velocities.append(x_velocity)
+            pass_timing = {"y_mm": pass_y, "x_s": duration, "lines": [line for _, line in lines],
+                           "samples": [captures[sensor].voltages.size for sensor, _ in lines],
+                           "achieved_rate": float(captures[0].achieved_rate)}
+            pass_timings.append(pass_timing)
+            print(f"[Terminal] X Velocity: {x_velocity:.2f} mm/s (commanded {RASTER_SPEED_MM_S:.0f} mm/s)")
+            reference = captures[0]
+            print(f"[Terminal] ADC: {reference.achieved_rate:.1f} SPS of {adc_bus.sampling_rate:g} per sensor, "
+                  f"jitter {reference.jitter * 1000:.2f} ms, dropped {reference.dropped}")
+
+            if i == len(passes) - 1:
+                break  # No Y move after the last pass; the next scan starts here
+            next_y = passes[i + 1][0]
+            y_duration = move_axis_to("Y", motor_y, next_y, steps_per_mm=steps_per_mm)
+            pass_timing["y_move_s"] = y_duration
+            y_velocity = abs(next_y - pass_y) / y_duration if y_duration > 0 else 0
+            y_velocities.append(y_velocity)
+            print(f"[Terminal] Y Velocity: {y_velocity:.2f} mm/s")
+    finally:
+        adc_bus.set_rate(idle_rate)
+
+    # Keep rows in increasing Y whatever order the passes and sensors recorded them in
+    order = np.argsort(row_lines, kind="stable")
+    data_matrix = [data_matrix[j] for j in order]
+    row_timestamps = [row_timestamps[j] for j in order]
+    row_stats = [row_stats[j] for j in order]
+    row_positions = [row_positions[j] for j in order]
+    row_lines = [row_lines[j] for j in order]
 
-    for i in range(total_y_increments):
-        
-        # Forward X scan
-        row_data = []
-        stop_event.clear()
-        adc_thread = threading.Thread(target=acquire_adc_data, args=(chan, sampling_rate, row_data, stop_event))
-        adc_thread.start()
-        global current_x_velocity, current_y_velocity
-        duration = move_motor(motor_x, total_x_steps, stepper.FORWARD)
-        stop_event.set()
-        adc_thread.join()
-        data_matrix.append(row_data)
-        
-        # Calculate and update velocity
-        
-        
-        x_velocity = 110 / duration if duration > 0 else 0
-        y_velocity = step_increment_y / (0.002 * total_y_steps)
-        #current_x_velocity = x_velocity
-        #current_y_velocity = y_velocity
-        print(f"[Terminal] X Velocity: {x_velocity:.2f} mm/s, Y Velocity: {y_velocity:.2f} mm/s")
-        x_velocities.append(x_velocity)
-        y_velocities.append(y_velocity)
-        
-        
-
-
-
-        move_motor(motor_y, total_y_steps, stepper.FORWARD)
-        y_increment_count += 1
-        if y_increment_count > total_y_increments + 1:
-            break
-
-        # Backward X scan
-        row_data = []
-        stop_event.clear()
-        adc_thread = threading.Thread(target=acquire_adc_data, args=(chan, sampling_rate, row_data, stop_event))
-        adc_thread.start()
-        duration=move_motor(motor_x, total_x_steps, stepper.BACKWARD)
-        stop_event.set()
-        adc_thread.join()
-        row_data.reverse()
-        data_matrix.append(row_data)
-        
-        
-        x_velocity = 110 / duration if duration > 0 else 0
-        y_velocity = step_increment_y / (0.002 * total_y_steps)
-        #current_x_velocity = x_velocity
-        #current_y_velocity = y_velocity
-        print(f"[Terminal] X Velocity: {x_velocity:.2f} mm/s, Y Velocity: {y_velocity:.2f} mm/s")
-        x_velocities.append(x_velocity)
-        y_velocities.append(y_velocity)
-        
-        
-
-
-
-
-        move_motor(motor_y, total_y_steps, stepper.FORWARD)
-        y_increment_count += 1
-        if y_increment_count > total_y_increments + 1:
-            break
-    
     avg_x_velocity = sum(x_velocities) / len(x_velocities) if x_velocities else 0
     avg_y_velocity = sum(y_velocities) / len(y_velocities) if y_velocities else 0
 
@@ -179,27 +370,355 @@ def move_in_zigzag_pattern(motor_x, motor_y, chan, sampling_rate, step_increment
     
 
 
+def scan_adaptive(motor_x, motor_y, adc_bus, sampling_rate, step_increment_y, steps_per_mm, update_velocity,
+                  on_row=None, x_direction=stepper.FORWARD, y_direction=stepper.FORWARD, coarse_passes=None):
+    """Coarse-to-fine scan: a raster every COARSE_FACTOR lines at sampling_rate,
+    then only the lines around regions that stand out from the background,
+    at the full Y pitch and FINE_RATE_FACTOR times the rate.
+
+    Rows from both stages end up in data_matrix on their fine-line index;
+    build_scan_grid(fill_lines=True) interpolates the lines never scanned.
+    Returns a summary of what was scanned for the archive.
+    """
+    total_lines = scan_rows(step_increment_y, Y_TRAVEL_MM)
+    offsets = [sensor.y_offset_mm for sensor in adc_bus.sensors]
+    if coarse_passes is None:
+        coarse_passes = plan_passes(total_lines, step_increment_y, offsets, wanted=coarse_lines(total_lines))
+    move_in_zigzag_pattern(motor_x, motor_y, adc_bus, sampling_rate, step_increment_y, steps_per_mm, update_velocity,
+                           on_row=on_row, x_direction=x_direction, y_direction=y_direction, passes=coarse_passes)
+    summary = {"total_lines": total_lines, "coarse_factor": COARSE_FACTOR, "coarse_lines": len(row_lines),
+               "refined_lines": 0, "coarse_passes": len(coarse_passes), "fine_passes": 0}
+    if scan_stop_early.is_set() or len(row_lines) < 2:
+        return summary
+
+    coarse_grid = resample_rows(data_matrix, row_positions, X_TRAVEL_MM)
+    wanted = refine_lines(coarse_grid, row_lines, total_lines, pitch_mm=GRID_PITCH_MM)
+    if not wanted.any():
+        print("Adaptive scan: nothing stands out from the background; no refinement needed.")
+        return summary
+    fine_passes = plan_passes(total_lines, step_increment_y, offsets, wanted=wanted)
+    remaining = np.ones(total_lines, dtype=bool)
+    remaining[row_lines] = False
+    rest_passes = plan_passes(total_lines, step_increment_y, offsets, wanted=remaining)
+    if len(fine_passes) >= len(rest_passes):
+        # Scattered refinement saves nothing over finishing the full raster, which covers every line
+        wanted, fine_passes = remaining, rest_passes
+    fine_rate = min(sampling_rate * FINE_RATE_FACTOR, adc_bus.max_rate)
+    print(f"Adaptive scan: refining {int(wanted.sum())} of {total_lines} lines in {len(fine_passes)} passes "
+          f"at {fine_rate:g} SPS...")
+
+    # Continue from wherever the coarse raster left the head
+    x_direction = stepper.FORWARD if head_position.mm("X") < X_HOME_MM + X_TRAVEL_MM / 2 else stepper.BACKWARD
+    near_end = abs(head_position.mm("Y") - fine_passes[-1][0]) < abs(head_position.mm("Y") - fine_passes[0][0])
+    y_direction = stepper.BACKWARD if near_end else stepper.FORWARD
+    move_in_zigzag_pattern(motor_x, motor_y, adc_bus, fine_rate, step_increment_y, steps_per_mm, update_velocity,
+                           on_row=on_row, x_direction=x_direction, y_direction=y_direction, passes=fine_passes,
+                           append=True)
+    summary.update(refined_lines=int(wanted.sum()), fine_passes=len(fine_passes), fine_sampling_rate=fine_rate)
+    return summary
+
+
+# Map every sample to its X position and build a fixed (rows, mm) grid. This is the grid
+# that is analyzed and archived, row for row what the stream sends; only the heatmap is smoothed.
+def build_scan_grid(data_matrix, row_positions, row_lines=None, fill_lines=False):
+    # Lines between the first and last scanned one that have no row stay NaN, unless fill_lines interpolates them
+    row_index = None if row_lines is None else np.asarray(row_lines) - min(row_lines)
+    grid = resample_rows(data_matrix, row_positions, X_TRAVEL_MM, row_index=row_index)
+    if fill_lines:
+        grid = fill_missing_lines(grid)
+    return grid
+
+
 # Function to generate heatmap
-def generate_heatmap(data_matrix):
+def generate_heatmap(scan_grid):
+    # Colour-maps the grid in NumPy; the PNG archive copy is written in the background
     print("Generating heatmap...")
-    max_length = max(len(row) for row in data_matrix)
-    padded_data_matrix = np.full((len(data_matrix), max_length), np.nan)
-    for i, row in enumerate(data_matrix):
-        padded_data_matrix[i, :len(row)] = row
-    data_matrix_filtered = gaussian_filter(np.nan_to_num(padded_data_matrix), sigma=1)
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(data_matrix_filtered, cmap="coolwarm", xticklabels=False, yticklabels=False,
-                mask=np.isnan(padded_data_matrix), cbar_kws={'label': 'Voltage (V)','shrink' : 0.8})
-    plt.title('mmWave Signal Intensity (V)',fontsize = 20)
-    plt.xlabel('X Position (cm)',fontsize = 16)
-    plt.ylabel('Y Position (cm)',fontsize = 16)
+    smoothed = smooth_grid(scan_grid, sigma=1)
+    vmin, vmax = color_range(smoothed)
+    rgb = colorize(smoothed, vmin, vmax)
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    #desktop_path = os.path.join(os.path.expanduser("~"), "/home/furdeengregg/Desktop/Senior Design Team & Gregg Data Collection")
-    save_path = "/home/furdeengregg/Desktop/Senior Design Team & Gregg Data Collection/KIVY GUI"
-    heatmap_filename = os.path.join(save_path, f"heatmap_{timestamp}.png")
-    plt.savefig(heatmap_filename)
-    print(f"Heatmap saved as {heatmap_filename}")
-    return heatmap_filename
+    heatmap_filename = os.path.join(IMAGE_DIRECTORY, f"heatmap_{timestamp}.png")
+    save_png_async(rgb, heatmap_filename)
+    return heatmap_filename, rgb, (vmin, vmax)
+
+
+# Uploads RGB heatmaps to the GPU, reusing one texture while the grid size is unchanged
+class HeatmapTexture:
+    def __init__(self):
+        self.texture = None
+
+    def update(self, rgb):
+        rows, cols = rgb.shape[:2]
+        if self.texture is None or self.texture.size != (cols, rows):
+            self.texture = Texture.create(size=(cols, rows), colorfmt='rgb')
+            self.texture.mag_filter = 'linear'
+            self.texture.flip_vertical()  # Row 0 at the top, as in the saved PNG
+        self.texture.blit_buffer(np.ascontiguousarray(rgb).tobytes(), colorfmt='rgb', bufferfmt='ubyte')
+        return self.texture
+
+
+# Heatmap built up row by row during a scan; only the new row is uploaded
+# unless it widens the colour scale, which recolours what is there so far
+class LiveHeatmap:
+    def __init__(self, total_rows, cols):
+        self.values = np.full((total_rows, cols), np.nan, dtype=np.float32)
+        self.vmin = self.vmax = None
+        self.texture = Texture.create(size=(cols, total_rows), colorfmt='rgb')
+        self.texture.mag_filter = 'linear'
+        self.texture.flip_vertical()
+        self.texture.blit_buffer(bytes(total_rows * cols * 3), colorfmt='rgb', bufferfmt='ubyte')
+
+    def add_row(self, index, row_values):
+        self.values[index] = row_values
+        if not np.any(~np.isnan(row_values)):
+            return
+        low, high = float(np.nanmin(row_values)), float(np.nanmax(row_values))
+        if self.vmin is None or low < self.vmin or high > self.vmax:
+            # Widen with some headroom so later rows rarely force another full redraw
+            low = low if self.vmin is None else min(low, self.vmin)
+            high = high if self.vmax is None else max(high, self.vmax)
+            margin = 0.1 * (high - low) if high > low else 1e-3
+            self.vmin, self.vmax = low - margin, high + margin
+            rgb = colorize(self.values, self.vmin, self.vmax)
+            self.texture.blit_buffer(rgb.tobytes(), colorfmt='rgb', bufferfmt='ubyte')
+        else:
+            rgb = colorize(self.values[index:index + 1], self.vmin, self.vmax)
+            self.texture.blit_buffer(rgb.tobytes(), pos=(0, index), size=(rgb.shape[1], 1),
+                                     colorfmt='rgb', bufferfmt='ubyte')
+
+
+# Colour scale next to the heatmap; the gradient texture is built once
+class Colorbar(BoxLayout):
+    def __init__(self, **kwargs):
+        super(Colorbar, self).__init__(orientation='vertical', spacing=4, **kwargs)
+        gradient = Texture.create(size=(1, len(COLORMAP_LUT)), colorfmt='rgb')
+        gradient.blit_buffer(COLORMAP_LUT.tobytes(), colorfmt='rgb', bufferfmt='ubyte')
+        self.max_label = Label(text="", font_size='12sp', size_hint=(1, None), height=20)
+        self.gradient = Image(texture=gradient, allow_stretch=True, keep_ratio=False)
+        self.min_label = Label(text="", font_size='12sp', size_hint=(1, None), height=20)
+        self.unit_label = Label(text="Voltage (V)", font_size='12sp', size_hint=(1, None), height=20)
+        for widget in (self.max_label, self.gradient, self.min_label, self.unit_label):
+            self.add_widget(widget)
+
+    def set_range(self, vmin, vmax):
+        self.max_label.text = f"{vmax:.2f}"
+        self.min_label.text = f"{vmin:.2f}"
+
+
+class ScanJob:
+    """Runs the scan pipeline on a worker thread.
+
+    Progress is reported as events (dicts with at least "state") delivered to
+    on_event on the Kivy main thread via Clock. States run queued -> homing ->
+    scanning -> rendering -> analyzing -> done, or end in cancelled / failed.
+    Each event carries the per-stage timings so far.
+    """
+
+    STATES = ("queued", "homing", "scanning", "rendering", "analyzing", "done", "cancelled", "failed")
+
+    def __init__(self, screen, sampling_rate, y_increment, z_height, on_event, adaptive=False):
+        self.screen = screen
+        self.sampling_rate = sampling_rate
+        self.y_increment = y_increment
+        self.z_height = z_height
+        self.adaptive = adaptive
+        self.on_event = on_event
+        self.state = "queued"
+        self.timings = {}
+        self.steps = {}  # Finer timings inside the stages: homing moves, render, upload
+        self.analysis_timing = {}
+        self.thread = None
+
+    def start(self):
+        scan_cancel.clear()
+        scan_stop_early.clear()
+        self._emit("queued")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        scan_cancel.set()
+
+    def stop_early(self):
+        scan_stop_early.set()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _emit(self, state, **info):
+        self.state = state
+        event = dict(info, state=state, timings=dict(self.timings))
+        Clock.schedule_once(lambda dt: self.on_event(event))
+
+    def _stage(self, state, func, *args, **kwargs):
+        self._emit(state)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.timings[state] = time.perf_counter() - start
+
+    def timing_record(self, archive=None):
+        """Structured timings of this scan, for the archive and SCAN_TIMING_LOG."""
+        rates = [stats["achieved_rate"] for stats in row_stats]
+        samples = [stats["samples"] for stats in row_stats if "samples" in stats]
+        return {
+            "scan": os.path.basename(archive.path) if archive is not None else None,
+            "finished": datetime.now().isoformat(),
+            "status": self.state,
+            "adaptive": self.adaptive,
+            "stages": dict(self.timings),
+            "steps": dict(self.steps),
+            "passes": pass_timings,
+            "adc": {
+                "rows": len(row_stats),
+                "requested_rate": self.sampling_rate,
+                "achieved_rate": float(np.mean(rates)) if rates else None,
+                "samples_per_row": float(np.mean(samples)) if samples else None,
+                "dropped": int(sum(stats.get("dropped", 0) for stats in row_stats)),
+            },
+            "analysis": dict(self.analysis_timing),
+        }
+
+    def _log_timing(self, archive):
+        record = self.timing_record(archive)
+        try:
+            os.makedirs(os.path.dirname(SCAN_TIMING_LOG), exist_ok=True)
+            with open(SCAN_TIMING_LOG, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Could not log scan timing: {e}")
+        return record
+
+    def _run(self):
+        screen = self.screen
+        # Provisional results from the stream thread are dropped once the scan stage is over,
+        # so a late one can't follow "rendering"
+        provisional_lock = threading.Lock()
+        scanning = [True]
+
+        def on_provisional(result):
+            with provisional_lock:
+                if scanning[0]:
+                    self._emit("scanning", provisional=result)
+        stream = ScanStreamClient(on_provisional=on_provisional)
+        rows_done = []
+        sensors = screen.adc_bus.sensors
+        total_rows = passes = None
+        y_reversed = False
+        archive = None
+        # The stream's row window needs rows in Y order; with several sensors
+        # they arrive out of order, so each is held until its predecessors are sent
+        held_rows = {}
+        next_stream_line = [0]
+
+        def stream_in_order(line, row):
+            held_rows[line] = row
+            step = -1 if y_reversed else 1
+            while next_stream_line[0] in held_rows:
+                stream.send_row(held_rows.pop(next_stream_line[0]))
+                next_stream_line[0] += step
+
+        def on_row(line, row, timestamps, positions, forward, stats):
+            # Resampled onto the final grid's columns: the live view updates just this row, and the
+            # stream scores the same values an upload of the grid would
+            row_values = resample_rows([row], [positions], X_TRAVEL_MM)[0]
+            stream_in_order(line, row_values)
+            rows_done.append(len(row))
+            archive.append_row(row, timestamps, positions, y_index=line,
+                               direction=1 if forward else -1, stats=stats)
+            self._emit("scanning", row=len(rows_done), total_rows=total_rows,
+                       grid_row=line, row_values=row_values)
+
+        # Flag the saved position as unreliable until the motors stop
+        head_position.save(in_motion=True)
+        try:
+            if not 0 < self.y_increment <= Y_TRAVEL_MM:
+                raise ValueError(f"Y increment must be between 0 and {Y_TRAVEL_MM} mm, not {self.y_increment}")
+            total_rows = scan_rows(self.y_increment, Y_TRAVEL_MM)
+            # Adaptive scans start with the coarse raster; the refinement passes depend on what it finds
+            passes = plan_passes(total_rows, self.y_increment, [sensor.y_offset_mm for sensor in sensors],
+                                 wanted=coarse_lines(total_rows) if self.adaptive else None)
+
+            def home():
+                with timed(self.steps, "home_z_s"):
+                    move_third_actuator(screen.motor_z, self.z_height)
+                with timed(self.steps, "home_xy_s"):
+                    return move_to_scan_start(screen.motor_x, screen.motor_y, screen.steps_per_mm, passes[-1][0])
+            x_direction, y_direction = self._stage("homing", home)
+            y_reversed = y_direction == stepper.BACKWARD
+            next_stream_line[0] = total_rows - 1 if y_reversed else 0
+
+            # Raw rows are archived as they arrive so re-analysis never needs a re-scan
+            archive = ScanArchiveWriter(
+                os.path.join(ARCHIVE_DIRECTORY, datetime.now().strftime("scan_%Y-%m-%d_%H-%M-%S") + ARCHIVE_SUFFIX),
+                sampling_rate=self.sampling_rate, y_increment_mm=self.y_increment, z_height_mm=self.z_height,
+                steps_per_mm=screen.steps_per_mm, x_travel_mm=X_TRAVEL_MM, planned_rows=total_rows,
+                raster_speed_mm_s=RASTER_SPEED_MM_S, started=datetime.now().isoformat(),
+                sensors=[{"name": sensor.name, "y_offset_mm": sensor.y_offset_mm} for sensor in sensors],
+                passes=len(passes), adaptive=self.adaptive)
+            if self.adaptive:
+                # Lines arrive coarse first and some are never scanned, so rows can't be streamed in order
+                adaptive_summary = self._stage(
+                    "scanning", scan_adaptive, screen.motor_x, screen.motor_y, screen.adc_bus,
+                    self.sampling_rate, self.y_increment, screen.steps_per_mm,
+                    update_velocity=screen.update_velocity_display, on_row=on_row,
+                    x_direction=x_direction, y_direction=y_direction, coarse_passes=passes)
+            else:
+                stream.start(reverse=y_reversed)
+                adaptive_summary = None
+                self._stage("scanning", move_in_zigzag_pattern, screen.motor_x, screen.motor_y, screen.adc_bus,
+                            self.sampling_rate, self.y_increment, screen.steps_per_mm,
+                            update_velocity=screen.update_velocity_display, on_row=on_row,
+                            x_direction=x_direction, y_direction=y_direction, passes=passes)
+            with provisional_lock:
+                scanning[0] = False
+            head_position.save()
+            if not data_matrix:
+                raise MoveCancelled(0)  # Stopped before the first pass completed
+
+            def render():
+                with timed(self.steps, "grid_s"):
+                    grid = build_scan_grid(data_matrix, row_positions, row_lines, fill_lines=self.adaptive)
+                with timed(self.steps, "heatmap_s"):
+                    return (grid,) + generate_heatmap(grid)
+            grid, image_path, rgb, color_scale = self._stage("rendering", render)
+
+            def analyze():
+                # Rows still held back (a stop with gaps between lines) never reached the stream
+                if held_rows:
+                    stream.discard()
+                with timed(self.steps, "stream_finish_s"):
+                    streamed = stream.finish(tiles=ANALYSIS_TILES)
+                if streamed:
+                    self.analysis_timing["path"] = "/scan/stream"
+                    return streamed
+                return screen.analyze_matrix_with_ai(grid, timing=self.analysis_timing)
+            analysis_result = self._stage("analyzing", analyze)
+            self.state = "done"
+            archive.close(grid=grid, status="stopped_early" if scan_stop_early.is_set() else "complete",
+                          heatmap=image_path, analysis=analysis_result,
+                          x_velocities=x_velocities, y_velocities=y_velocities, adaptive_summary=adaptive_summary,
+                          timing=self._log_timing(archive))
+            self._emit("done", image_path=image_path, result=analysis_result, rgb=rgb, color_scale=color_scale)
+        except MoveCancelled:
+            head_position.save()
+            stream.discard()
+            self.state = "cancelled"
+            if archive is not None:
+                archive.close(status="cancelled", timing=self._log_timing(archive))
+            self._emit("cancelled")
+        except Exception as e:
+            stream.discard()
+            # A move may have failed partway, so the counted position can't be trusted: home next time
+            head_position.known = False
+            head_position.save(in_motion=True)
+            self.state = "failed"
+            if archive is not None:
+                archive.close(status="failed", error=str(e), timing=self._log_timing(archive))
+            self._emit("failed", error=str(e))
+
 
 # Intro Screen
 class IntroScreen(Screen):
@@ -211,34 +730,50 @@ class IntroScreen(Screen):
                      size_hint=(None, None), size=(500, 500)) 
         layout.add_widget(logo)        
         self.add_widget(layout)
+        # What startup is still waiting for, under the logo
+        self.status_label = Label(text="Starting...", font_size='16sp', size_hint=(1, None), height=40,
+                                  pos_hint={'x': 0, 'y': 0.05})
+        self.add_widget(self.status_label)
 
     def on_enter(self):
-        Clock.schedule_once(self.switch_to_main, 5)
+        # The splash stays up only until startup is done; the timeout covers hardware that keeps failing
+        Clock.schedule_once(self.switch_to_main, SPLASH_MAX_SECONDS)
+        self.update_status(startup)
+
+    def update_status(self, tracker):
+        if self.manager is None or self.manager.current != self.name:
+            return
+        if tracker.all_ready:
+            self.switch_to_main()
+            return
+        waiting = [f"{name}: {status}" for name, status in sorted(tracker.status.items()) if status != "ready"]
+        self.status_label.text = "Waiting for " + "; ".join(waiting)
 
     def switch_to_main(self, *args):
+        if self.manager.current != self.name:
+            return
+        Clock.unschedule(self.switch_to_main)
         self.manager.current = 'main'
+        startup.mark("main_screen")
+        startup.report()
 
 # Main Screen
 class MainScreen(Screen):
     def __init__(self, **kwargs):
         super(MainScreen, self).__init__(**kwargs)
 
-        # Initialize MotorKit instances
-        self.kit1 = MotorKit(address=0x60)  # First bonnet
-        self.kit2 = MotorKit(address=0x61)  # Second bonnet
-        
-        # Define Steps_per_mm
-        self.steps_per_mm = 200 /( 2 * 3.14 * 10) 
-
-        # Define motors
-        self.motor_x = self.kit1.stepper1
-        self.motor_y = self.kit1.stepper2
-        self.motor_z = self.kit2.stepper1
+        # Motors and ADCs come up on a background thread while the UI is built,
+        # retrying until they answer; scanning is enabled once they have
+        self.hardware = None
+        self.motor_x = self.motor_y = self.motor_z = None
+        self.adc_bus = None
+        self.hardware_init = RetryingInit("hardware", self.connect_hardware, startup,
+                                          on_ready=lambda result: Clock.schedule_once(
+                                              lambda dt: self.on_hardware_ready(*result)))
+        self.hardware_init.start()
 
-        # Initialize I2C and ADC
-        i2c = board.I2C()
-        ads = ADS.ADS1115(i2c)
-        self.chan = AnalogIn(ads, ADS.P0)
+        # Define Steps_per_mm
+        self.steps_per_mm = STEPS_PER_MM
 
         main_layout = BoxLayout(orientation='vertical', padding=20, spacing=20)
         # Title at the top, centered and in red
@@ -270,21 +805,34 @@ class MainScreen(Screen):
 
         self.image_widget = Image(
             source="",  # Don't use None
-            size_hint=(1, 1),
+            size_hint=(0.9, 1),
             pos_hint={'x': 0 ,'y': 0},
+            allow_stretch=True,
+            keep_ratio=False,
             opacity=0
         )
         image_container.add_widget(self.image_widget)
+        self.heatmap_texture = HeatmapTexture()
+        self.colorbar = Colorbar(size_hint=(0.1, 1), pos_hint={'right': 1, 'y': 0}, opacity=0)
+        image_container.add_widget(self.colorbar)
         left_layout.add_widget(image_container)
         self.scanned_image_label = Label(text="Scanned Image displayed Here", font_size='20sp', size_hint=(1, None), height=30)
         left_layout.add_widget(self.scanned_image_label)
         bottom_buttons_layout = BoxLayout(orientation='horizontal', size_hint=(1, None), height=60, padding=(10, 10))
         self.previous_scans_button = Button(text="Previous Scans")
-        self.scan_now_button = Button(text="Scan Now")
+        self.scan_now_button = Button(text="Scan Now", disabled=True)  # Until the hardware is ready
+        self.abort_button = Button(text="Abort", disabled=True)
+        self.stop_early_button = Button(text="Stop & Analyze", disabled=True)
         self.previous_scans_button.bind(on_release=self.open_previous_scans)
         self.scan_now_button.bind(on_release=self.start_scan)
+        self.abort_button.bind(on_release=self.abort_scan)
+        self.stop_early_button.bind(on_release=self.stop_scan_early)
         bottom_buttons_layout.add_widget(self.previous_scans_button)
         bottom_buttons_layout.add_widget(self.scan_now_button)
+        bottom_buttons_layout.add_widget(self.stop_early_button)
+        bottom_buttons_layout.add_widget(self.abort_button)
+        self.scan_job = None
+        self.live_heatmap = None
         left_layout.add_widget(bottom_buttons_layout)
         content_layout.add_widget(left_layout)
 
@@ -330,6 +878,14 @@ class MainScreen(Screen):
         z_axis_layout.add_widget(self.z_axis_input)
         stages_box.add_widget(z_axis_layout)
 
+        mode_layout = BoxLayout(orientation='horizontal', spacing=5)
+        mode_label = Label(text="Scan Mode:")
+        # Coarse raster first, then fine passes only where something stands out
+        self.adaptive_toggle = ToggleButton(text="Adaptive")
+        mode_layout.add_widget(mode_label)
+        mode_layout.add_widget(self.adaptive_toggle)
+        stages_box.add_widget(mode_layout)
+
         right_layout.add_widget(stages_box)
 
         # Velocity Box
@@ -390,6 +946,7 @@ class MainScreen(Screen):
 
         # Schedule ADC data updates
         Clock.schedule_interval(self.update_adc_data, 0.1)
+        Clock.schedule_interval(self.update_position_display, 0.2)
         #Clock.schedule_interval(self.update_velocity_gui, 0.1)
         
         
@@ -408,102 +965,212 @@ class MainScreen(Screen):
         self.velocity_inputs['Y'].text = f"{current_y_velocity:.2f} mm/s"
         self.velocity_inputs['Z'].text = "0.00 mm/s"
     
+    def update_position_display(self, dt):
+        # Reads the tracked position only; no hardware access
+        if not head_position.known:
+            return
+        for axis, display in self.display_position_inputs.items():
+            display.text = f"{head_position.mm(axis):.1f} mm"
+
+    @staticmethod
+    def connect_hardware():
+        # Runs on the init thread: motors, ADCs, and the sample bus that owns the ADCs
+        hardware = create_hardware()
+        # The only reader of the ADCs; the display and scans both take samples from it
+        adc_bus = AdcSampleBus(hardware.sensors, IDLE_SAMPLING_RATE)
+        adc_bus.start()
+        return hardware, adc_bus
+
+    def on_hardware_ready(self, hardware, adc_bus):
+        self.hardware = hardware
+        self.motor_x = hardware.motor_x
+        self.motor_y = hardware.motor_y
+        self.motor_z = hardware.motor_z
+        self.adc_bus = adc_bus
+        if self.scan_job is None or not self.scan_job.running:
+            self.scan_now_button.disabled = False
+
     def update_adc_data(self, dt):
         """
-        Updates the ADC data display with the latest value from the ADS1115 ADC.
+        Updates the ADC display with rolling statistics from the sample bus (no I2C access).
         """
-        try:
-            adc_value = self.chan.voltage  # Read actual ADC voltage
-            for i, label in enumerate(self.adc_data_display):
-                label.text = f"ADC Value {i + 1}: {adc_value:.2f} V"
-            
-                
-                
-        except Exception as e:
+        if self.adc_bus is None:
+            error = self.hardware_init.last_error
             for label in self.adc_data_display:
-                label.text = f"Error reading ADC: {e}"
-                
-                
-
-    def analyze_image_with_ai(self, image_path):
-        try:
-            url = "http://127.0.0.1:8000/analyze"
-            with open(image_path, "rb") as image_file:
-                files = {"file": image_file}
-                response = requests.post(url, files=files)
-            return response.json() if response.ok else {"error": "API error"}
-        except Exception as e:
-            return {"error": str(e)}
+                label.text = f"Hardware not ready, retrying: {error}" if error else "Connecting to hardware..."
+            return
+        stats = self.adc_bus.window_stats(ADC_DISPLAY_WINDOW)
+        if self.adc_bus.last_error is not None and stats is None:
+            for label in self.adc_data_display:
+                label.text = f"Error reading ADC: {self.adc_bus.last_error}"
+            return
+        if stats is None:
+            return
+        lines = (
+            f"Latest: {stats['latest']:.3f} V",
+            f"Mean ({ADC_DISPLAY_WINDOW:g} s): {stats['mean']:.3f} V",
+            f"Min / Max: {stats['min']:.3f} / {stats['max']:.3f} V",
+            f"Std Dev: {stats['std'] * 1000:.1f} mV",
+            f"Rate: {stats['rate']:.0f} SPS, dropped {self.adc_bus.dropped}",
+        )
+        for label, text in zip(self.adc_data_display, lines):
+            label.text = text
 
+    def analyze_matrix_with_ai(self, matrix, timing=None):
+        # Send raw voltages instead of the rendered PNG; no plot styling in the analysis
+        return analysis_client.analyze(encode_matrix(matrix), CONTENT_TYPE, tiles=ANALYSIS_TILES, timing=timing)
 
 
 
                 
     def start_scan(self, *args):
+            if self.adc_bus is None or self.scan_job is not None and self.scan_job.running:
+                return
             try:
                 sampling_rate = float(self.sampling_rate_input.text)
                 y_axis_value = float(self.y_axis_input.text)
                 z_axis_value = float(self.z_axis_input.text)
-
-                move_third_actuator(self.motor_z, z_axis_value)
-
-                reset_axes(self.motor_x, self.motor_y, self.steps_per_mm)
-                
-                
-                
-                move_in_zigzag_pattern(self.motor_x, self.motor_y, self.chan, sampling_rate, y_axis_value,self.steps_per_mm, update_velocity = self.update_velocity_display)
-                image_path = generate_heatmap(data_matrix)
-                analysis_result = self.analyze_image_with_ai(image_path)
-
-                self.image_widget.source = image_path
-                self.image_widget.opacity = 1
-                self.image_widget.reload()  # Forces the widget to reload the image
-                self.scanned_image_label.text = "Scanning Complete. Heatmap displayed above."
-               
-                if "error" in analysis_result:
-                    self.scanned_image_label.text += f"\n[AI Error] {analysis_result['error']}"
-                else:
-                    heur = analysis_result.get("heuristic", {})
-                    summary = (f"\n[AI Feedback]"
-                               f"\n - Object: {heur.get('object', 'N/A')}"
-                               f"\n - Threat: {heur.get('threat_score', 'N/A')}"
-                               f"\n - Sharpness: {heur.get('sharpness', 'N/A')}")
-                    self.scanned_image_label.text += summary
-               
-               
-               
-               
-               
-                # Calculate total Y increments and X passes
-                y_increments = int(130 / y_axis_value)
-                x_passes = len(data_matrix)  
-                # Update Display Position box fields
-                self.display_position_inputs['X'].text = str(x_passes)
-                self.display_position_inputs['Y'].text = str(y_increments)
-                self.display_position_inputs['Z'].text = "0.00 mm"  # or str(z_axis_value) if you want to reflect user input                             
-
             except ValueError:
                 self.scanned_image_label.text = "Invalid input. Please enter valid numbers."
-    
-    
+                return
+            if sampling_rate <= 0 or not 0 < y_axis_value <= Y_TRAVEL_MM or z_axis_value < 0:
+                self.scanned_image_label.text = (f"Invalid input: the sampling rate must be positive, the Y increment "
+                                                 f"between 0 and {Y_TRAVEL_MM} mm and the Z height not negative.")
+                return
+
+            self.scan_now_button.disabled = True
+            self.abort_button.disabled = False
+            self.live_heatmap = None
+            self.scan_job = ScanJob(self, sampling_rate, y_axis_value, z_axis_value, on_event=self.on_scan_event,
+                                    adaptive=self.adaptive_toggle.state == 'down')
+            self.scan_job.start()
+
+    def abort_scan(self, *args):
+        if self.scan_job is not None:
+            self.scanned_image_label.text = "Aborting scan..."
+            self.scan_job.cancel()
+
+    def stop_scan_early(self, *args):
+        # Finish the current pass, then render and analyze the partial scan
+        if self.scan_job is not None:
+            self.scanned_image_label.text = "Stopping after this pass..."
+            self.stop_early_button.disabled = True
+            self.scan_job.stop_early()
+
+    def show_live_row(self, event):
+        if self.live_heatmap is None:
+            self.live_heatmap = LiveHeatmap(event["total_rows"], len(event["row_values"]))
+            self.image_widget.texture = self.live_heatmap.texture
+            self.image_widget.opacity = 1
+            self.colorbar.opacity = 1
+        self.live_heatmap.add_row(event["grid_row"], event["row_values"])
+        self.colorbar.set_range(self.live_heatmap.vmin or 0.0, self.live_heatmap.vmax or 0.0)
+        self.image_widget.canvas.ask_update()
+
+    def on_scan_event(self, event):
+        state = event["state"]
+        if state == "scanning" and "row" in event:
+            self.show_live_row(event)
+            self.scanned_image_label.text = f"Scanning row {event['row']} of {event['total_rows']}..."
+        elif state == "scanning" and "provisional" in event:
+            provisional = event["provisional"]
+            self.scanned_image_label.text = (f"Scanning... provisional threat {provisional['threat_score']} "
+                                             f"after {provisional['rows']} rows")
+        elif state in ("queued", "homing", "scanning", "rendering", "analyzing"):
+            self.stop_early_button.disabled = state != "scanning"
+            self.scanned_image_label.text = f"{state.capitalize()}..."
+        else:
+            self.scan_now_button.disabled = self.adc_bus is None
+            self.abort_button.disabled = True
+            self.stop_early_button.disabled = True
+            timings = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in event["timings"].items())
+            print(f"[Terminal] Scan {state}: {timings}")
+            if state == "done":
+                self.show_scan_result(event["rgb"], event["color_scale"], event["result"])
+            elif state == "cancelled":
+                self.scanned_image_label.text = "Scan aborted."
+            else:
+                self.scanned_image_label.text = f"Scan failed: {event['error']}"
+
+    def show_scan_result(self, rgb, color_scale, analysis_result):
+        # Straight from the RGB buffer to the GPU; no PNG round-trip through disk
+        self.image_widget.texture = self.heatmap_texture.update(rgb)
+        self.image_widget.opacity = 1
+        self.colorbar.set_range(*color_scale)
+        self.colorbar.opacity = 1
+        self.scanned_image_label.text = "Scanning Complete. Heatmap displayed above."
+
+        if "error" in analysis_result:
+            self.scanned_image_label.text += f"\n[AI Error] {analysis_result['error']}"
+        else:
+            heur = analysis_result.get("heuristic", {})
+            summary = (f"\n[AI Feedback]"
+                       f"\n - Object: {heur.get('object', 'N/A')}"
+                       f"\n - Threat: {heur.get('threat_score', 'N/A')}"
+                       f"\n - Sharpness: {heur.get('sharpness', 'N/A')}")
+            regions = heur.get("regions")
+            if regions and regions["top"]:
+                # Streamed results score the whole scan only; uploads also locate the worst region
+                top = regions["top"][0]
+                summary += (f"\n - Highest region: {top['object']} ({top['threat_score']}) "
+                            f"at tile {top['row'] + 1},{top['col'] + 1} of {regions['grid'][0]}x{regions['grid'][1]}")
+            similar = analysis_result.get("similar")
+            if similar:
+                # The backend's nearest earlier scan by fingerprint, with the verdict it got
+                match = similar[0]
+                summary += (f"\n - Closest prior scan: {match['object']} ({match['threat_score']}), "
+                            f"similarity {match['similarity']:.2f}")
+            self.scanned_image_label.text += summary
 
-   
     def open_previous_scans(self, *args):
             self.manager.current = 'previous_scans'    
     
 
+# One tile in the Previous Scans grid; RecycleView reuses these for visible rows only
+class ScanTile(RecycleDataViewBehavior, BoxLayout):
+    def __init__(self, **kwargs):
+        super(ScanTile, self).__init__(orientation='vertical', padding=10, **kwargs)
+        self.image = Image(size_hint=(1, 1), allow_stretch=True)
+        self.label = Label(size_hint=(1, None), height=20, font_size='12sp')
+        self.add_widget(self.image)
+        self.add_widget(self.label)
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.image.source = data['thumbnail']
+        self.label.text = data['name']
+        if not data['thumbnail']:
+            rv.request_thumbnail(index)
+
+
+class ScanRecycleView(RecycleView):
+    def __init__(self, screen, **kwargs):
+        super(ScanRecycleView, self).__init__(**kwargs)
+        self.screen = screen
+        self.viewclass = ScanTile
+        layout = RecycleGridLayout(cols=2, spacing=15, padding=10, size_hint_y=None,
+                                   default_size=(None, 220), default_size_hint=(1, None))
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+
+    def request_thumbnail(self, index):
+        self.screen.request_thumbnail(index)
+
+
 # Previous Scans Screen
 class PreviousScansScreen(Screen):
+    PAGE_SIZE = 40
+
     def __init__(self, **kwargs):
         super(PreviousScansScreen, self).__init__(**kwargs)
 
-        self.layout = BoxLayout(orientation='vertical')
-        self.scroll_view = ScrollView(size_hint=(1, 1))
-        self.outer_layout = BoxLayout(orientation='vertical', spacing=20, size_hint_y=None, padding=10)
-        self.outer_layout.bind(minimum_height=self.outer_layout.setter('height'))
+        self.scan_index = ScanIndex(IMAGE_DIRECTORY)
+        self.thumbnails = None  # Created on first visit, when IMAGE_DIRECTORY is needed
+        self.loaded = 0
 
-        self.scroll_view.add_widget(self.outer_layout)
-        self.layout.add_widget(self.scroll_view)
+        self.layout = BoxLayout(orientation='vertical')
+        self.recycle_view = ScanRecycleView(self, size_hint=(1, 1))
+        self.recycle_view.bind(scroll_y=self.on_scroll)
+        self.layout.add_widget(self.recycle_view)
 
         back_button = Button(text="Back", size_hint=(1, None), height=50)
         back_button.bind(on_release=self.go_back)
@@ -512,40 +1179,97 @@ class PreviousScansScreen(Screen):
         self.add_widget(self.layout)
 
     def on_pre_enter(self, *args):
-        self.load_images()  # Reloads every time you navigate to this screen
+        self.load_images()  # Only re-lists the directory if it changed
 
     def load_images(self):
-        self.outer_layout.clear_widgets()
-
-        images = sorted(
-            [img for img in os.listdir(IMAGE_DIRECTORY) if img.endswith(('.png', '.jpg', '.jpeg'))],
-            key=lambda x: os.path.getmtime(os.path.join(IMAGE_DIRECTORY, x)),
-            reverse=True
-        )
-
-        images_per_row = 2
-        for i in range(0, len(images), images_per_row):
-            row_layout = BoxLayout(orientation='horizontal', spacing=15, size_hint_y=None, height=220, padding=10)
-            for img_file in images[i:i + images_per_row]:
-                img_path = os.path.join(IMAGE_DIRECTORY, img_file)
-                image = Image(source=img_path, size_hint=(None, None), size=(300, 200))
-                row_layout.add_widget(image)
-            self.outer_layout.add_widget(row_layout)
+        if self.thumbnails is None:
+            self.thumbnails = ThumbnailCache(os.path.join(IMAGE_DIRECTORY, ".thumbnails"))
+        if self.scan_index.refresh() or not self.recycle_view.data:
+            self.loaded = 0
+            self.recycle_view.data = []
+            self.load_page()
+
+    def load_page(self):
+        names = self.scan_index.names[self.loaded:self.loaded + self.PAGE_SIZE]
+        self.loaded += len(names)
+        self.recycle_view.data.extend({'name': name, 'thumbnail': ''} for name in names)
+
+    def on_scroll(self, view, scroll_y):
+        # Next page once the user reaches the bottom
+        if scroll_y <= 0 and self.loaded < len(self.scan_index.names):
+            self.load_page()
+
+    def request_thumbnail(self, index):
+        name = self.recycle_view.data[index]['name']
+        mtime = self.scan_index.entries.get(name)
+        if mtime is None:
+            return
+        path = self.thumbnails.get(self.scan_index.path(name), name, mtime, self.on_thumbnail_ready)
+        if path:
+            self.set_thumbnail(name, path)
+
+    def on_thumbnail_ready(self, name, path):
+        Clock.schedule_once(lambda dt: self.set_thumbnail(name, path))
+
+    def set_thumbnail(self, name, path):
+        for i, item in enumerate(self.recycle_view.data):
+            if item['name'] == name:
+                self.recycle_view.data[i] = {'name': name, 'thumbnail': path}
+                break
 
     def go_back(self, *args):
         self.manager.current = 'main'
 
 
 
+def toggle_profiler(*args):
+    # SIGUSR1 handler: start sampling, or stop and save the collapsed stacks gathered so far
+    if not profiler.enabled:
+        profiler.reset()
+        profiler.start()
+        print("[Profiler] Sampling started")
+        return
+    profiler.stop()
+    path = os.path.join(PROFILE_DIRECTORY, datetime.now().strftime("profile_%Y-%m-%d_%H-%M-%S.txt"))
+    try:
+        os.makedirs(PROFILE_DIRECTORY, exist_ok=True)
+        with open(path, "w") as f:
+            f.write(profiler.collapsed())
+        print(f"[Profiler] {profiler.samples} samples saved to {path}")
+    except OSError as e:
+        print(f"Could not save profile: {e}")
+
+
 # Main App
 class mmWaveApp(App):
     def build(self):
+        startup.mark("build")
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, toggle_profiler)
+        if os.environ.get("SCANPROTECH_PROFILE") == "1":
+            toggle_profiler()
+        startup.notify = lambda tracker: Clock.schedule_once(lambda dt: self.intro_screen.update_status(tracker))
+        startup.expect("ui")
+        preload_modules(startup)
         sm = ScreenManager()
-        sm.add_widget(IntroScreen(name='intro'))
-        sm.add_widget(MainScreen(name='main'))
+        self.intro_screen = IntroScreen(name='intro')
+        sm.add_widget(self.intro_screen)
+        self.main_screen = MainScreen(name='main')  # Starts the hardware init thread first thing
+        sm.add_widget(self.main_screen)
         sm.add_widget(PreviousScansScreen(name='previous_scans'))
         sm.current = 'intro'
         return sm
 
+    def on_start(self):
+        # The window is up and every screen is built
+        startup.ready("ui")
+
+    def on_stop(self):
+        if profiler.enabled:
+            toggle_profiler()  # Save what was sampled
+        self.main_screen.hardware_init.stop()
+        if self.main_screen.adc_bus is not None:
+            self.main_screen.adc_bus.stop()
+
 if __name__ == '__main__':
     mmWaveApp().run()
@@ -0,0 +1,102 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+THUMBNAIL_SIZE = (300, 200)
+
+
+class ScanIndex:
+    """Scan images in a directory, newest first, kept up to date incrementally.
+
+    Heatmaps are written once (renamed into place) and never modified, so the
+    directory's own mtime tells us whether anything was added or removed.
+    When it changes, only names not seen before are stat'ed.
+    """
+
+    def __init__(self, directory, extensions=IMAGE_EXTENSIONS):
+        self.directory = directory
+        self.extensions = extensions
+        self.entries = {}  # name -> mtime_ns
+        self.names = []  # newest first
+        self._directory_mtime = None
+
+    def refresh(self):
+        # Returns True when the listing changed
+        try:
+            directory_mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            changed = bool(self.entries)
+            self.entries, self.names, self._directory_mtime = {}, [], None
+            return changed
+        if directory_mtime == self._directory_mtime:
+            return False
+
+        entries = {}
+        with os.scandir(self.directory) as listing:
+            for entry in listing:
+                if not entry.name.endswith(self.extensions):
+                    continue
+                mtime = self.entries.get(entry.name)
+                if mtime is None:
+                    try:
+                        mtime = entry.stat().st_mtime_ns
+                    except OSError:
+                        continue
+                entries[entry.name] = mtime
+        self.entries = entries
+        self.names = sorted(entries, key=entries.get, reverse=True)
+        self._directory_mtime = directory_mtime
+        return True
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+class ThumbnailCache:
+    """Small PNG thumbnails on disk, generated on a background thread.
+
+    Thumbnails are keyed by source name and mtime, so a replaced source gets
+    a fresh thumbnail and existing ones survive restarts.
+    """
+
+    def __init__(self, cache_directory, size=THUMBNAIL_SIZE):
+        self.cache_directory = cache_directory
+        self.size = size
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnails")
+        os.makedirs(cache_directory, exist_ok=True)
+
+    def thumbnail_path(self, name, mtime):
+        stem = os.path.splitext(name)[0]
+        return os.path.join(self.cache_directory, f"{stem}_{mtime}.png")
+
+    def get(self, source_path, name, mtime, on_ready):
+        """Thumbnail path if cached; otherwise None, and on_ready(name, path) is
+        called from the worker thread once it has been generated."""
+        path = self.thumbnail_path(name, mtime)
+        if os.path.exists(path):
+            return path
+        with self._lock:
+            if path in self._pending:
+                return None
+            self._pending.add(path)
+        self._executor.submit(self._generate, source_path, name, path, on_ready)
+        return None
+
+    def _generate(self, source_path, name, path, on_ready):
+        from PIL import Image as PILImage
+        try:
+            with PILImage.open(source_path) as image:
+                image.thumbnail(self.size)
+                temp_path = path + ".tmp"
+                image.save(temp_path, format="PNG")
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not create thumbnail for {name}: {e}")
+            return
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+        on_ready(name, path)
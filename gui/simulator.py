@@ -0,0 +1,177 @@
+import threading
+import time
+import numpy as np
+from adafruit_motor import stepper
+from acquisition import ADS1115_MODE_CONTINUOUS
+
+MODE_SINGLE = 0x0100  # adafruit_ads1x15's Mode.SINGLE
+
+# Per-operation latencies of the real bus, roughly: a MotorKit step is a few
+# PCA9685 register writes, an ADS1115 read one register read, both at 100 kHz I2C
+STEP_LATENCY_S = 0.0005
+I2C_READ_LATENCY_S = 0.0003
+NOISE_V = 0.005
+
+
+class Phantom:
+    """Synthetic object on the bed: sensor voltage as a function of position (mm).
+
+    Shapes are ("rect", x0, y0, x1, y1, volts) or ("disc", cx, cy, radius,
+    volts) added to a flat background, with edges softened over edge_mm so
+    the signal looks like a sensor footprint rather than a step.
+    """
+
+    DEFAULT_SHAPES = (
+        ("rect", 30, 40, 60, 70, 1.4),  # Metal plate
+        ("disc", 85, 95, 12, 0.7),  # Denser object
+    )
+
+    def __init__(self, shapes=DEFAULT_SHAPES, background=1.2, edge_mm=1.5):
+        self.shapes = shapes
+        self.background = background
+        self.edge_mm = edge_mm
+
+    def _inside(self, distance):
+        # Smooth 0..1 step, distance > 0 outside the shape
+        return 1 / (1 + np.exp(np.clip(distance / self.edge_mm, -50, 50) * 4))
+
+    def voltage(self, x, y):
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        value = np.full(np.broadcast(x, y).shape, self.background)
+        for shape in self.shapes:
+            if shape[0] == "rect":
+                _, x0, y0, x1, y1, volts = shape
+                distance = np.maximum(np.maximum(x0 - x, x - x1), np.maximum(y0 - y, y - y1))
+            else:
+                _, cx, cy, radius, volts = shape
+                distance = np.hypot(x - cx, y - cy) - radius
+            value = value + volts * self._inside(distance)
+        return value
+
+    def grid(self, width_mm, height_mm, pitch_mm=1.0, x0_mm=0.0):
+        # Ground truth on the scan grid (X cells from x0_mm), for comparing a simulated scan against
+        x = x0_mm + (np.arange(int(round(width_mm / pitch_mm))) + 0.5) * pitch_mm
+        y = np.arange(int(round(height_mm / pitch_mm))) * pitch_mm
+        return self.voltage(x[None, :], y[:, None])
+
+
+class SimulatedHead:
+    # Where the simulated motors have put the head, in steps per axis. Axes in
+    # travel_mm stop at 0 and at their travel like the frame's ends: steps past
+    # them are lost, as when a real stepper stalls against the end (there are no limit switches).
+    def __init__(self, steps_per_mm, start_mm=None, travel_mm=None):
+        self.steps_per_mm = steps_per_mm
+        self.limits = {axis: int(round(mm * steps_per_mm[axis])) for axis, mm in (travel_mm or {}).items()}
+        self.steps = {axis: self.clamp(axis, int(round((start_mm or {}).get(axis, 0) * spm)))
+                      for axis, spm in steps_per_mm.items()}
+
+    def clamp(self, axis, steps):
+        limit = self.limits.get(axis)
+        return steps if limit is None else min(max(steps, 0), limit)
+
+    def mm(self, axis):
+        return self.steps[axis] / self.steps_per_mm[axis]
+
+
+class SimulatedStepper:
+    """Stands in for a MotorKit stepper: each onestep takes step_latency and moves the head."""
+
+    def __init__(self, head, axis, step_latency=STEP_LATENCY_S):
+        self.head = head
+        self.axis = axis
+        self.step_latency = step_latency
+
+    def onestep(self, direction=stepper.FORWARD, style=stepper.SINGLE):
+        if self.step_latency > 0:
+            time.sleep(self.step_latency)
+        steps = self.head.steps[self.axis] + (1 if direction == stepper.FORWARD else -1)
+        self.head.steps[self.axis] = self.head.clamp(self.axis, steps)
+        return self.head.steps[self.axis]
+
+    def release(self):
+        pass
+
+
+class SimulatedAds1115:
+    """Stands in for an ADS1115 on the I2C bus when no hardware is attached.
+
+    Conversions take 1 / data_rate seconds like the real chip. In
+    continuous mode, reading the input converted last returns after just the
+    I2C transaction; switching inputs, or any read in single-shot mode,
+    waits for a fresh conversion. Reads on one chip are serialized as they
+    would be on the bus.
+    """
+
+    def __init__(self, address=0x48, data_rate=128, mode=MODE_SINGLE, i2c_latency=0.0):
+        self.address = address
+        self.data_rate = data_rate
+        self.mode = mode
+        self.i2c_latency = i2c_latency
+        self._last_pin = None
+        self._lock = threading.Lock()
+
+    def convert(self, pin):
+        with self._lock:
+            delay = self.i2c_latency
+            if self.mode != ADS1115_MODE_CONTINUOUS or pin != self._last_pin:
+                delay += 1 / self.data_rate
+                self._last_pin = pin
+            if delay > 0:
+                time.sleep(delay)
+
+
+class SimulatedChannel:
+    """An AnalogIn-like input whose voltage comes from signal(timestamp).
+
+    The default signal is a slow drift around 1.65 V. Gaussian noise is
+    added from a seeded generator, so a given seed gives the same noise
+    sequence every run.
+    """
+
+    def __init__(self, ads, pin, signal=None, noise=NOISE_V, seed=None):
+        self.ads = ads
+        self.pin = pin
+        self.signal = signal or (lambda t: 1.65 + 0.2 * np.sin(0.5 * t + pin))
+        self.noise = noise
+        self._random = np.random.default_rng(seed)
+
+    @property
+    def voltage(self):
+        self.ads.convert(self.pin)
+        value = self.signal(time.perf_counter()) + self._random.normal(0, self.noise)
+        return float(np.clip(value, 0.0, 3.3))
+
+
+class Simulation:
+    """A simulated scanner: steppers that move a virtual head over a phantom,
+    and ADS1115 inputs that read the phantom under each sensor.
+
+    Latencies and noise are parameters so benchmarks can model a given bus;
+    the seed makes the noise reproducible. travel_mm gives the frame's travel
+    per axis; the head can't leave 0..travel on those axes.
+    """
+
+    def __init__(self, steps_per_mm, phantom=None, start_mm=None, travel_mm=None, step_latency=STEP_LATENCY_S,
+                 i2c_latency=I2C_READ_LATENCY_S, noise=NOISE_V, seed=0):
+        self.head = SimulatedHead(steps_per_mm, start_mm, travel_mm)
+        self.phantom = phantom or Phantom()
+        self.step_latency = step_latency
+        self.i2c_latency = i2c_latency
+        self.noise = noise
+        self.seed = seed
+        self._chips = {}
+        self._channels = 0
+
+    def motor(self, axis):
+        return SimulatedStepper(self.head, axis, self.step_latency)
+
+    def adc(self, address):
+        if address not in self._chips:
+            self._chips[address] = SimulatedAds1115(address, i2c_latency=self.i2c_latency)
+        return self._chips[address]
+
+    def channel(self, ads, pin, y_offset_mm=0.0):
+        head, phantom = self.head, self.phantom
+        self._channels += 1
+        return SimulatedChannel(ads, pin, noise=self.noise, seed=self.seed + self._channels,
+                                signal=lambda t: float(phantom.voltage(head.mm("X"), head.mm("Y") + y_offset_mm)))
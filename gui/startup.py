@@ -0,0 +1,137 @@
+import importlib
+import json
+import os
+import threading
+import time
+
+# Startup milestones and import timings are written here after every boot. For a
+# per-module breakdown of the import phase:  python -X importtime scan.py 2> imports.txt
+STARTUP_PROFILE_FILE = os.path.join(os.path.expanduser("~"), ".scanprotech_startup.json")
+# Modules only needed once a scan runs; imported on a background thread behind the splash
+DEFERRED_MODULES = ("scipy.ndimage", "requests", "PIL.Image")
+# Seconds between hardware attempts; the last delay repeats until one succeeds
+RETRY_DELAYS = (1, 2, 5, 10)
+
+
+class StartupTracker:
+    """What is still coming up at startup, and when each piece got there.
+
+    Components are registered as pending and then marked ready or failed
+    from any thread. notify(tracker) is called after every change; the app
+    passes one that hops to the Kivy main thread. Milestones are seconds
+    since `started`, which the entry module takes before its own imports.
+    """
+
+    def __init__(self, started, notify=None):
+        self.started = started
+        self.notify = notify
+        self.milestones = {}
+        self.imports = {}
+        self.pending = set()
+        self.status = {}  # component -> "pending" | "ready" | "failed: ..." text for the splash
+        self._lock = threading.Lock()
+
+    def mark(self, milestone):
+        self.milestones.setdefault(milestone, round(time.perf_counter() - self.started, 4))
+
+    def expect(self, component):
+        with self._lock:
+            self.pending.add(component)
+            self.status[component] = "pending"
+
+    def ready(self, component):
+        with self._lock:
+            self.pending.discard(component)
+            self.status[component] = "ready"
+        self.mark(f"{component}_ready")
+        self._changed()
+
+    def failed(self, component, message):
+        with self._lock:
+            self.status[component] = f"failed: {message}"
+        self._changed()
+
+    @property
+    def all_ready(self):
+        return not self.pending
+
+    def _changed(self):
+        if self.notify is not None:
+            self.notify(self)
+
+    def report(self, path=STARTUP_PROFILE_FILE):
+        # Printed once startup is over, and saved so boots can be compared
+        profile = {"milestones": self.milestones, "imports": self.imports, "status": self.status}
+        print("[Startup] " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.milestones.items()))
+        try:
+            with open(path, "w") as f:
+                json.dump(profile, f, indent=2)
+        except OSError as e:
+            print(f"Could not save startup profile: {e}")
+        return profile
+
+
+def preload_modules(tracker, modules=DEFERRED_MODULES, component="modules"):
+    """Import modules the UI doesn't need to appear, on a background thread.
+
+    Whatever imports them later finds them in sys.modules; if a scan starts
+    before the preload is done, Python's import lock makes it wait for the
+    module instead of importing it twice.
+    """
+    tracker.expect(component)
+
+    def run():
+        for name in modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                print(f"Could not preload {name}: {e}")
+            tracker.imports[name] = round(time.perf_counter() - start, 4)
+        tracker.ready(component)
+
+    thread = threading.Thread(target=run, daemon=True, name="preload")
+    thread.start()
+    return thread
+
+
+class RetryingInit:
+    """Runs factory() on a background thread until it succeeds.
+
+    on_ready(result) is called once with the result; every failure is
+    reported to the tracker and retried after the next of retry_delays.
+    Stopping ends the retries (for app shutdown).
+    """
+
+    def __init__(self, component, factory, tracker, on_ready, retry_delays=RETRY_DELAYS):
+        self.component = component
+        self.factory = factory
+        self.tracker = tracker
+        self.on_ready = on_ready
+        self.retry_delays = retry_delays
+        self.attempts = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+        tracker.expect(component)
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name=f"init-{self.component}").start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.attempts += 1
+            try:
+                result = self.factory()
+            except Exception as e:
+                self.last_error = e
+                delay = self.retry_delays[min(self.attempts, len(self.retry_delays)) - 1]
+                print(f"{self.component} init failed (attempt {self.attempts}), retrying in {delay}s: {e}")
+                self.tracker.failed(self.component, f"{e} (retrying, attempt {self.attempts})")
+                self._stop_event.wait(delay)
+                continue
+            self.on_ready(result)
+            self.tracker.ready(self.component)
+            return
@@ -0,0 +1,48 @@
+import numpy as np
+
+from adaptive import coarse_lines, refine_lines, fill_missing_lines, MAX_REFINED_FRACTION
+
+TOTAL_LINES = 28
+WIDTH_MM = 110
+
+
+def coarse_grid(target_lines=(), seed=0):
+    # Noisy 1.2 V bed sampled on the coarse lines, with a 20 mm wide target on target_lines
+    lines = np.flatnonzero(coarse_lines(TOTAL_LINES))
+    rng = np.random.default_rng(seed)
+    grid = 1.2 + rng.normal(0, 0.005, (len(lines), WIDTH_MM))
+    for row, line in enumerate(lines):
+        if line in target_lines:
+            grid[row, 40:60] += 0.5
+    return grid, lines
+
+
+def test_flat_bed_needs_no_refinement():
+    grid, lines = coarse_grid()
+    assert not refine_lines(grid, lines, TOTAL_LINES).any()
+
+
+def test_localized_target_takes_fewer_passes_than_a_raster():
+    grid, lines = coarse_grid(target_lines=range(11, 15))
+    wanted = refine_lines(grid, lines, TOTAL_LINES)
+    # Single sensor: one pass per line, coarse lines plus refined lines
+    assert wanted.any()
+    assert len(lines) + wanted.sum() < TOTAL_LINES
+    assert not wanted[lines].any()
+    assert wanted[9:12].all() and wanted[13:16].all()  # Both gaps around the target's coarse line 12
+
+
+def test_refinement_is_capped():
+    rng = np.random.default_rng(1)
+    grid, lines = coarse_grid()
+    grid += rng.choice([0.0, 0.5], size=(len(lines), 1))  # Every coarse line stands out from its neighbours
+    wanted = refine_lines(grid, lines, TOTAL_LINES)
+    refined_gaps = sum(wanted[a + 1:b].any() for a, b in zip(lines[:-1], lines[1:]))
+    assert refined_gaps <= np.ceil(MAX_REFINED_FRACTION * (len(lines) - 1))
+
+
+def test_fill_missing_lines_interpolates_between_measured_rows():
+    grid = np.full((5, 3), np.nan)
+    grid[0], grid[4] = 0.0, 4.0
+    filled = fill_missing_lines(grid)
+    assert np.allclose(filled[:, 0], [0, 1, 2, 3, 4])
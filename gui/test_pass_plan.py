@@ -0,0 +1,40 @@
+import numpy as np
+
+from pass_plan import scan_rows, plan_passes
+
+
+def covered_lines(passes):
+    return sorted(line for _, lines in passes for _, line in lines)
+
+
+def test_scan_rows_covers_the_travel():
+    assert scan_rows(10, 130) == 15  # 13 increments and the two extra lines
+    assert scan_rows(130, 130) == 2
+    assert scan_rows(200, 130) == 0
+
+
+def test_single_sensor_takes_one_pass_per_line():
+    passes = plan_passes(5, 10, [0.0])
+    assert passes == [(0, [(0, 0)]), (10, [(0, 1)]), (20, [(0, 2)]), (30, [(0, 3)]), (40, [(0, 4)])]
+
+
+def test_sensors_one_line_apart_split_the_passes():
+    passes = plan_passes(12, 10, [0.0, 10.0, 20.0])
+    assert covered_lines(passes) == list(range(12))
+    assert len(passes) == 4
+    assert [y for y, _ in passes] == [0, 30, 60, 90]
+
+
+def test_offsets_are_rounded_to_lines_and_every_line_is_recorded_once():
+    passes = plan_passes(13, 5, [2.0, 14.0])  # Second sensor 12 mm behind, rounded to 2 lines
+    assert covered_lines(passes) == list(range(13))
+    assert len(passes) < 13
+    assert all(y % 5 == 0 for y, _ in passes)  # Passes sit on lines
+
+
+def test_wanted_limits_the_plan():
+    wanted = np.zeros(10, dtype=bool)
+    wanted[[2, 3, 7]] = True
+    passes = plan_passes(10, 10, [0.0, 10.0], wanted=wanted)
+    assert covered_lines(passes) == [2, 3, 7]
+    assert passes[0] == (20, [(0, 2), (1, 3)])
@@ -0,0 +1,43 @@
+import numpy as np
+
+from resample import sample_positions, resample_rows, smooth_grid
+
+
+def test_sample_positions_interpolate_between_steps():
+    steps = np.array([1.0, 2.0, 3.0, 4.0])
+    positions = sample_positions([1.5, 4.0], steps, steps_per_mm=2, travel_mm=2)
+    assert np.allclose(positions, [0.75, 2.0])
+    assert np.allclose(sample_positions([1.5, 4.0], steps, steps_per_mm=2, reverse=True, travel_mm=2), [1.25, 0.0])
+
+
+def test_resample_rows_interpolates_at_cell_centres():
+    positions = np.linspace(0, 10, 7)
+    grid = resample_rows([2 * positions], [positions], travel_mm=10)
+    assert grid.shape == (1, 10)
+    assert grid.dtype == np.float32
+    assert np.allclose(grid[0], 2 * (np.arange(10) + 0.5))
+
+
+def test_backward_pass_matches_forward_pass():
+    positions = np.linspace(0, 10, 23)
+    values = np.sin(positions)
+    forward = resample_rows([values], [positions], travel_mm=10)
+    backward = resample_rows([values[::-1]], [positions[::-1]], travel_mm=10)
+    assert np.array_equal(forward, backward)
+
+
+def test_cells_outside_a_row_stay_nan():
+    positions = np.array([2.0, 5.0, 8.0])
+    grid = resample_rows([[1.0, 1.0, 1.0], []], [positions, []], travel_mm=10, row_index=[0, 2], n_rows=4)
+    assert grid.shape == (4, 10)
+    assert np.isnan(grid[0, :2]).all() and np.isnan(grid[0, 8:]).all()
+    assert np.allclose(grid[0, 2:8], 1.0)
+    assert np.isnan(grid[1:]).all()
+
+
+def test_smooth_grid_keeps_a_flat_grid_and_its_gaps():
+    grid = np.full((8, 20), 1.5, dtype=np.float32)
+    grid[:, 15:] = np.nan
+    smoothed = smooth_grid(grid, sigma=1)
+    assert np.allclose(smoothed[:, :15], 1.5)
+    assert np.isnan(smoothed[:, 19]).all()  # Far from any sample